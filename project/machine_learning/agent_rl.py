@@ -1,5 +1,4 @@
 import pickle
-import random
 from collections import defaultdict
 from dataclasses import dataclass
 from typing import Dict, List
@@ -30,13 +29,14 @@ class AgentRL(Model, Judge):
         gamma: float = 0.9,
         view: Rect = Rect(3, 3),
         exploration_judge: Judge = GreedyJudge(),
+        seed: int | None = None,
     ):
+        super().__init__(view=view, seed=seed)
         self.mode = mode
         self.wfc = wfc
         self.epsilon = epsilon
         self.alpha = alpha
         self.gamma = gamma
-        self.view = view
         self.exploration_judge = exploration_judge
         self.q_table: Dict[tuple, QValue] = defaultdict(float)
 
@@ -50,22 +50,20 @@ class AgentRL(Model, Judge):
         with open(filename, "rb") as f:
             self.q_table = pickle.load(f)
 
-    def select(self, point: Point) -> MetaPattern:
+    def select(self, objects: List[MetaPattern], state: np.ndarray) -> MetaPattern:
         """Choose a pattern based on epsilon-greedy policy."""
-        possible_patterns = self._get_possible_patterns(point)
-        state = self._observe(point).flatten().tobytes()
-
-        if (random.random() < self.epsilon) and self.mode == ModelMode.TRAINIG:
-            return self.exploration_judge.select()
+        if (self.random.random() < self.epsilon) and self.mode == ModelMode.TRAINIG:
+            return self.exploration_judge.select(objects=objects, state=state)
 
+        key = np.ascontiguousarray(state).tobytes()
         return max(
-            possible_patterns,
-            key=lambda pattern: self.q_table.get((state, pattern.uid), 0),
+            objects,
+            key=lambda pattern: self.q_table.get((key, pattern.uid), 0),
         )
 
     def _observe(self, point: Point) -> np.ndarray:
         """Get a view of patterns around a given point."""
-        return self.wfc.grid.get_patterns_around_point(p=point, view=self.view)
+        return self.wfc.grid.observe(p=point, view=self.view)
 
     def _get_possible_patterns(self, point: Point) -> List[MetaPattern]:
         """Retrieve possible patterns for the specified point."""
@@ -87,23 +85,32 @@ class AgentRL(Model, Judge):
             reward + self.gamma * max_next_q - current_q_value
         )
 
-    def train(self, step_result: StepResult) -> bool:
+    def train(self, step_result: StepResult, mark: int) -> bool:
+        """
+        Learn from a failed step recorded on the grid's undo trail since mark.
+        The failed placement is undone, then every pattern possible at its cell
+        is placed in turn: a placement that leaves a cell without options is
+        rewarded -1 and undone, the first one that does not is rewarded 1 and
+        kept. Returns whether one was kept.
+        """
+        grid = self.wfc.grid
+        if not grid.record_trail:
+            raise ValueError("Training needs the failed step on the undo trail.")
         point = step_result.chosen_point
+        grid.undo(mark)
         initial_state = self._observe(point).flatten().tobytes()
         possible_patterns = self._get_possible_patterns(point)
 
         for pattern in possible_patterns:
-            self.wfc.grid.entropy[
-                step_result.failed_point.x, step_result.failed_point.y
-            ] = 999
-            self.wfc.grid.place_pattern(p=point, pattern=pattern)
-            zero_entropy_cell = self.wfc.grid.update_neighbors_entropy(p=point)
+            grid.place_pattern(p=point, pattern=pattern)
+            zero_entropy_cell = grid.update_neighbors_entropy(p=point)
 
             reward = -1 if zero_entropy_cell else 1
-            new_state = self.observe(point).flatten().tobytes()
+            new_state = self._observe(point).flatten().tobytes()
             self._update_q_table(initial_state, pattern.uid, reward, new_state)
 
             if zero_entropy_cell is None:
                 return True
+            grid.undo(mark)
 
         return False
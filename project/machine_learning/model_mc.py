@@ -1,128 +1,562 @@
 import json
-from collections import defaultdict
+import os
+from bisect import bisect_right
 from dataclasses import dataclass
-from itertools import combinations
+from itertools import accumulate
+from multiprocessing import get_context
 from pathlib import Path
-from typing import List, Tuple
+from typing import Iterable, List, Tuple
 
 import numpy as np
 from tqdm import tqdm
 
 from project.config import HIDDEN_CELL, TARGET_CELL
 from project.machine_learning.model import Model
+from project.machine_learning.transition_index import MODEL_EXTENSION, TransitionIndex
+from project.utils.sampling import derive_seed
 from project.utils.utils import Utils
-from project.wfc.grid import Grid, Point, Rect
+from project.wfc.corpus import CORPUS_EXTENSION, Corpus
+from project.wfc.grid import Grid, Rect
 from project.wfc.judge import Judge
 from project.wfc.pattern import MetaPattern
 from project.wfc.repository import repository
+from project.wfc.wfc import WFC
 from project.wfc.wobj import WeightedObject
 
 
 @dataclass
-class State(WeightedObject):
-    state: str
+class CountTable:
+    """Packed completed states in ascending order and how often each was seen."""
 
+    keys: np.ndarray
+    counts: np.ndarray
 
-class ModelMC(Model, Judge):
-    def __init__(self, seed: int | None = None, view: Rect = Rect(3, 3)):
-        super().__init__(view=view, seed=seed)
-        self.graph = defaultdict(lambda: defaultdict(int))
-        self.used_keys = set()
+    @classmethod
+    def empty(cls) -> "CountTable":
+        return cls(keys=np.empty(0, dtype=np.int64), counts=np.empty(0, dtype=np.int64))
+
+    @classmethod
+    def from_keys(cls, keys: np.ndarray) -> "CountTable":
+        keys, counts = np.unique(keys, return_counts=True)
+        return cls(keys=keys.astype(np.int64), counts=counts.astype(np.int64))
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def merge(self, other: "CountTable") -> "CountTable":
+        """Table with the counts of both, summed where the keys match."""
+        keys, inverse = np.unique(
+            np.concatenate([self.keys, other.keys]), return_inverse=True
+        )
+        counts = np.zeros(len(keys), dtype=np.int64)
+        np.add.at(counts, inverse, np.concatenate([self.counts, other.counts]))
+        return CountTable(keys=keys, counts=counts)
 
     @staticmethod
-    def _apply_hiding(
-        state: np.ndarray,
-        indices_to_hide: List[Tuple[int, int]],
-        hide_code: int = HIDDEN_CELL,
-    ) -> np.ndarray:
-        """Create a copy of the state with specified indices hidden."""
-        modified_state = state.copy()
-        for hx, hy in indices_to_hide:
-            modified_state[hx][hy] = hide_code
-        return modified_state
-
-    def train(self, grids_path: str, portion: float = 1.0):
-        grid_files = list(Path(grids_path).glob("*.dat"))
-        files_count = int(len(grid_files) * portion)
-        grid_files = grid_files[:files_count]
-
-        for file_path in tqdm(grid_files):
-            grid = Grid(patterns=repository.get_all_patterns())
-            grid.deserialize(repository, file_path)
-            for x, y, meta_pattern in grid.iterate_cells():
-                point = Point(x, y)
-                pattenrs = grid.get_patterns_around_point(
-                    p=point, view=self.view, is_extended=True
-                )
-                local_state = grid.get_patterns_property(pattenrs)
-                self.generate_paths_to_state(local_state)
+    def merge_all(tables: Iterable["CountTable"]) -> "CountTable":
+        """Merge pairwise in rounds, so every merge is between similar sizes."""
+        tables = list(tables)
+        if not tables:
+            return CountTable.empty()
+        while len(tables) > 1:
+            merged = [a.merge(b) for a, b in zip(tables[::2], tables[1::2])]
+            if len(tables) % 2:
+                merged.append(tables[-1])
+            tables = merged
+        return tables[0]
 
-    def select(
-        self, objects: List[WeightedObject], state: np.ndarray
-    ) -> MetaPattern | None:
-        cx, cy = 1, 1
-        state = self._apply_hiding(state, [(cx, cy)], TARGET_CELL)
-        serialized_state = Utils.encode_np_array(state)
-        self.used_keys.add(serialized_state)
 
-        if serialized_state not in self.graph:
+@dataclass
+class CompressionReport:
+    """
+    Sizes of a model before and after ModelMC.compress. kept_mass is the share
+    of the counted observations left after pruning. Tries and coverage, the
+    share of queried states the model knew, are measured on freshly seeded
+    grids when compress is given a benchmark rect.
+    """
+
+    states_before: int
+    states_after: int
+    edges_before: int
+    edges_after: int
+    bytes_before: int
+    bytes_after: int
+    kept_mass: float
+    mean_tries_before: float | None = None
+    mean_tries_after: float | None = None
+    coverage_before: float | None = None
+    coverage_after: float | None = None
+
+    @property
+    def size_ratio(self) -> float:
+        return self.bytes_after / self.bytes_before if self.bytes_before else 1.0
+
+    @property
+    def tries_change(self) -> float | None:
+        if self.mean_tries_before is None or self.mean_tries_after is None:
             return None
+        return self.mean_tries_after - self.mean_tries_before
 
-        states = [
-            State(state=key, weight=value)
-            for key, value in self.graph[serialized_state].items()
+    def __str__(self) -> str:
+        lines = [
+            f"States: {self.states_before} -> {self.states_after}",
+            f"Transitions: {self.edges_before} -> {self.edges_after}",
+            f"Size: {self.bytes_before / 1e6:.2f}MB -> {self.bytes_after / 1e6:.2f}MB "
+            f"({self.size_ratio:.1%})",
+            f"Kept mass: {self.kept_mass:.1%}",
         ]
+        if self.tries_change is not None:
+            lines.append(
+                f"Mean tries: {self.mean_tries_before:.2f} -> "
+                f"{self.mean_tries_after:.2f} ({self.tries_change:+.2f})"
+            )
+            lines.append(
+                f"Coverage: {self.coverage_before:.1%} -> {self.coverage_after:.1%}"
+            )
+        return "\n".join(lines)
 
-        next_state = Utils.weighted_choice(states, self.seed)
 
-        next_state = Utils.decode_np_array(
-            next_state.state, shape=(self.view.width, self.view.height)
-        )
+# model of a pool worker, built once by _initialize_worker
+_worker_model: "ModelMC | None" = None
 
-        changed_cells = np.argwhere((state == TARGET_CELL) & (next_state != state))
 
-        if len(changed_cells) != 1:
+def _initialize_worker(
+    view: Rect, uids: np.ndarray, patterns: List[MetaPattern]
+) -> None:
+    """Register the tileset in the worker's repository and build its model."""
+    global _worker_model
+    # a spawned worker starts with an empty repository
+    if repository.patterns is None:
+        repository.register_patterns(patterns)
+    _worker_model = ModelMC(view=view, uids=uids)
+
+
+def _count_shard(task: Tuple[str, List]) -> CountTable:
+    grids_path, items = task
+    return _worker_model.count_grids(grids_path, items)
+
+
+class ModelMC(Model, Judge):
+    """
+    Counts, for every local state with the center to fill, the states it was
+    completed into. States are packed into integers: the cells of the view are
+    digits in base P + 2, HIDDEN_CELL is 0, TARGET_CELL is 1 and the pattern
+    with the i-th smallest uid is i + 2.
+    """
+
+    def __init__(
+        self,
+        seed: int | None = None,
+        view: Rect = Rect(3, 3),
+        uids: np.ndarray | None = None,
+        max_used_keys: int = 2**16,
+    ):
+        super().__init__(view=view, seed=seed)
+        self._counts: CountTable | None = CountTable.empty()
+        self._index: TransitionIndex | None = None
+        # queried states, up to max_used_keys of them, and how many were known
+        self.used_keys = set()
+        self.max_used_keys = max_used_keys
+        self.hits = 0
+        self.misses = 0
+        self.uids: np.ndarray | None = None
+        if uids is not None:
+            self.set_uids(uids)
+
+    def set_uids(self, uids: np.ndarray) -> None:
+        """Fix the patterns the state keys are packed over."""
+        uids = np.unique(np.asarray(uids, dtype=np.int64))
+        if TARGET_CELL in uids or HIDDEN_CELL in uids:
+            raise ValueError("Pattern uids collide with the hidden or target codes.")
+        cells = self.view.width * self.view.height
+        base = len(uids) + 2
+        if base**cells > np.iinfo(np.int64).max:
+            # largest base whose keys still fit, less the hidden and target digits
+            fitting = int(np.iinfo(np.int64).max ** (1 / cells)) - 2
             raise ValueError(
-                "Unexpected number of changed cells. Expected exactly one."
+                f"States of {len(uids)} patterns in a {self.view.width}x"
+                f"{self.view.height} view do not fit in int64 keys, at most "
+                f"{fitting} patterns fit; use a smaller view or fewer patterns."
             )
+        self.uids = uids
+        self.base = base
+        self._powers = base ** np.arange(cells, dtype=np.int64)
+        self._center = int(
+            np.ravel_multi_index(self.view.center, (self.view.height, self.view.width))
+        )
+        # uid -> digit lookup table, its last entry maps HIDDEN_CELL to 0
+        self._digit_table = np.full(int(uids.max(initial=0)) + 2, -1, dtype=np.int64)
+        self._digit_table[uids] = np.arange(len(uids)) + 2
+        self._digit_table[TARGET_CELL] = 1
+        self._digit_table[HIDDEN_CELL] = 0
+        self._uid_list = uids.tolist()
+        # the same as lists, Python beats numpy on one small state
+        self._digit_list = self._digit_table.tolist()
+        self._power_list = self._powers.tolist()
 
-        selected_uid = next_state[tuple(changed_cells[0])]
-        selected_pattern = repository.get_pattern_by_uid(selected_uid)
-        return selected_pattern
+    def encode_digits(self, states: np.ndarray) -> np.ndarray:
+        """Digits of (..., height, width) uid states, flattened to (..., cells)."""
+        states = np.asarray(states)
+        if states.size and states.max() >= len(self._digit_table) - 1:
+            raise ValueError("State holds uids the model does not know.")
+        digits = self._digit_table[states]
+        if (digits < 0).any():
+            raise ValueError("State holds uids the model does not know.")
+        return digits.reshape(*states.shape[:-2], -1)
 
-    def generate_paths_to_state(self, state: np.ndarray) -> None:
-        view_indices = self.view.indices
-        cx, cy = self.view.center
-
-        default_hidden_idicies = {index for index in view_indices if state[index] == -1}
-        valid_indices_to_hide = [
-            index
-            for index in view_indices
-            if index != (cx, cy) and index not in default_hidden_idicies
+    def encode_state(self, state: np.ndarray) -> int:
+        """Integer key of a (height, width) uid state."""
+        return int(self.encode_digits(state) @ self._powers)
+
+    def _encode_target_state(self, state: np.ndarray) -> int:
+        """Integer key of a (height, width) uid state with TARGET_CELL in the center."""
+        uids = state.ravel().tolist()
+        uids[self._center] = TARGET_CELL
+        key = 0
+        for uid, power in zip(uids, self._power_list):
+            digit = self._digit_list[uid] if uid < len(self._digit_list) - 1 else -1
+            if digit < 0:
+                raise ValueError("State holds uids the model does not know.")
+            key += digit * power
+        return key
+
+    def get_center_uid(self, key: int) -> int | None:
+        """Uid of the pattern in the center of a packed state, None if not a pattern."""
+        digit = key // int(self._powers[self._center]) % self.base
+        return int(self.uids[digit - 2]) if digit >= 2 else None
+
+    @property
+    def counts(self) -> CountTable:
+        """Counts for training and merging, rebuilt from the index if loaded from one."""
+        if self._counts is None:
+            center_power = self._powers[self._center]
+            index = self._index
+            from_keys = np.repeat(index.from_keys, np.diff(index.offsets))
+            # the completed state has the target (digit target + 2) in the center
+            keys = (
+                from_keys
+                + (np.asarray(index.targets, dtype=np.int64) + 1) * center_power
+            )
+            order = np.argsort(keys)
+            self._counts = CountTable(
+                keys=keys[order], counts=np.asarray(index.counts, dtype=np.int64)[order]
+            )
+        return self._counts
+
+    @property
+    def index(self) -> TransitionIndex:
+        """Successors by state to fill for select, built from the counts on first use."""
+        if self._index is None:
+            keys = self.counts.keys
+            self._index = TransitionIndex.from_edges(
+                view=self.view,
+                uids=self.uids,
+                from_keys=self.get_keys_from(keys),
+                targets=keys // self._powers[self._center] % self.base - 2,
+                counts=self.counts.counts,
+            )
+        return self._index
+
+    def get_keys_from(self, keys: np.ndarray) -> np.ndarray:
+        """Packed states to fill of packed completed states: TARGET_CELL in the center."""
+        center_power = self._powers[self._center]
+        return keys - (keys // center_power % self.base - 1) * center_power
+
+    def add_counts(self, table: CountTable) -> None:
+        self._counts = self.counts.merge(table)
+        self._index = None
+
+    def merge(self, other: "ModelMC") -> None:
+        """Add the counts of a model trained on other grids, e.g. on another machine."""
+        if other.uids is None:
+            return
+        if self.uids is None:
+            self.view = other.view
+            self.set_uids(other.uids)
+        if other.view != self.view or not np.array_equal(other.uids, self.uids):
+            raise ValueError("Models with different views or patterns cannot merge.")
+        self.add_counts(other.counts)
+
+    def train(
+        self,
+        grids_path: str,
+        portion: float = 1.0,
+        workers: int = 1,
+        shard_size: int = 256,
+        mp_context: str = "spawn",
+    ):
+        """
+        Train on a corpus file or on a directory of .dat grids, with the patterns
+        of the repository. With several workers the grids are split into shards
+        counted on a pool of mp_context processes and the shard tables are merged.
+        Spawned workers import the main module, guard scripts by __name__.
+        """
+        if repository.patterns is None:
+            raise ValueError("Register the patterns in the repository to train.")
+        if self.uids is None:
+            self.set_uids(repository.uids)
+        if str(grids_path).endswith(CORPUS_EXTENSION):
+            items = list(range(int(len(Corpus(grids_path)) * portion)))
+        else:
+            grid_files = list(Path(grids_path).glob("*.dat"))
+            items = grid_files[: int(len(grid_files) * portion)]
+
+        if workers == 1:
+            self.add_counts(self.count_grids(grids_path, tqdm(items)))
+            return
+
+        shards = [
+            (grids_path, items[start : start + shard_size])
+            for start in range(0, len(items), shard_size)
         ]
+        with get_context(mp_context).Pool(
+            processes=workers or os.cpu_count(),
+            initializer=_initialize_worker,
+            initargs=(self.view, self.uids, repository.get_all_patterns()),
+        ) as pool:
+            tables = list(
+                tqdm(pool.imap_unordered(_count_shard, shards), total=len(shards))
+            )
+        self.add_counts(CountTable.merge_all(tables))
 
-        for num_hidden in range(len(valid_indices_to_hide) + 1):
-            for indices_to_hide in combinations(valid_indices_to_hide, num_hidden):
-                state_to = self._apply_hiding(state, indices_to_hide)
-                serialized_state_to = Utils.encode_np_array(state_to)
+    def count_grids(
+        self, grids_path: str, items: Iterable, buffer_size: int = 2**22
+    ) -> CountTable:
+        """
+        Count the states of some grids: indices into a corpus file or .dat files.
+        Keys are buffered and folded into the table once buffer_size are pending.
+        """
+        grid = Grid(patterns=repository.get_all_patterns())
+        corpus = None
+        if str(grids_path).endswith(CORPUS_EXTENSION):
+            corpus = Corpus(grids_path)
 
-                state_from = self._apply_hiding(state_to, [(cx, cy)], TARGET_CELL)
-                serialized_state_from = Utils.encode_np_array(state_from)
+        table = CountTable.empty()
+        pending, pending_size = [], 0
+        for item in items:
+            if corpus is not None:
+                corpus.load_into(grid, item)
+            else:
+                grid.deserialize(repository, item)
+            keys = self.get_paths_to_states(
+                grid.observe_all(self.view).reshape(
+                    -1, self.view.height, self.view.width
+                )
+            )
+            pending.append(keys)
+            pending_size += len(keys)
+            if pending_size >= buffer_size:
+                table = table.merge(CountTable.from_keys(np.concatenate(pending)))
+                pending, pending_size = [], 0
+        if pending:
+            table = table.merge(CountTable.from_keys(np.concatenate(pending)))
+        return table
 
-                self.graph[serialized_state_from][serialized_state_to] += 1
+    def get_paths_to_states(
+        self, states: np.ndarray, chunk_size: int = 2**20
+    ) -> np.ndarray:
+        """
+        Packed keys of every state obtained by hiding any subset of the visible
+        cells around the center of each (height, width) uid state. States whose
+        center holds no pattern complete nothing and are skipped.
+        """
+        digits = self.encode_digits(states)
+        digits = digits[digits[:, self._center] >= 2]
+        others = np.delete(np.arange(digits.shape[-1]), self._center)
+        # bit k of a mask hides the k-th cell around the center
+        masks = np.arange(2 ** len(others))
+        bits = (masks[:, None] >> np.arange(len(others))) & 1
+        hidden = digits[:, others] == 0
+        hidden_masks = hidden @ (1 << np.arange(len(others)))
+        keys = digits @ self._powers
+        values = digits[:, others] * self._powers[others]
 
-    def compress() -> None:
-        pass
+        paths = []
+        step = max(1, chunk_size // len(masks))
+        for start in range(0, len(digits), step):
+            chunk = slice(start, start + step)
+            # hidden cells are digit 0, so hiding removes their value from the key
+            removed = values[chunk] @ bits.T
+            # cells that are already hidden would give the same state twice
+            valid = (masks & hidden_masks[chunk, None]) == 0
+            paths.append((keys[chunk, None] - removed)[valid])
+        return np.concatenate(paths) if paths else np.empty(0, dtype=np.int64)
+
+    def generate_paths_to_state(self, state: np.ndarray) -> None:
+        self.add_counts(CountTable.from_keys(self.get_paths_to_states(state[None])))
+
+    def select(
+        self, objects: List[WeightedObject], state: np.ndarray
+    ) -> MetaPattern | None:
+        """
+        Sample the pattern of the center from the successors of the state,
+        leaving out those that are not among the objects.
+        """
+        key = self._encode_target_state(state)
+        if len(self.used_keys) < self.max_used_keys:
+            self.used_keys.add(key)
+
+        index = self.index
+        row = index.find(key)
+        if row < 0:
+            self.misses += 1
+            return None
+        self.hits += 1
+
+        start, end = int(index.offsets[row]), int(index.offsets[row + 1])
+        candidates = {obj.uid: obj for obj in objects}
+        uids = [self._uid_list[target] for target in index.targets[start:end].tolist()]
+        if all(uid in candidates for uid in uids):
+            # every successor is possible, the precomputed table applies
+            low = int(index.cumulative[start - 1]) if start > 0 else 0
+            cumulative = [c - low for c in index.cumulative[start:end].tolist()]
+        else:
+            weights = index.counts[start:end].tolist()
+            cumulative = list(
+                accumulate(
+                    w if uid in candidates else 0 for uid, w in zip(uids, weights)
+                )
+            )
+        if cumulative[-1] == 0:
+            return None
+        i = bisect_right(cumulative, self.random.random() * cumulative[-1])
+        return candidates[uids[i]]
+
+    def evaluate(
+        self, rect: Rect, grids: int = 20, seed: int = 0, max_tries: int = 100
+    ) -> Tuple[float, float]:
+        """
+        Mean tries to generate grids of rect with this model as the judge, a
+        failed grid counting max_tries, and the share of queried states it knew.
+        Grid i is generated from a seed derived from (seed, i).
+        """
+        wfc = WFC(
+            grid=Grid(patterns=repository.get_all_patterns(), rect=rect), judge=self
+        )
+        own_seed, hits, misses = self.seed, self.hits, self.misses
+        self.hits = self.misses = 0
+        all_tries = []
+        for i in range(grids):
+            self.reseed(derive_seed(seed, i))
+            tries = 1
+            while tries < max_tries and not wfc.generate():
+                tries += 1
+            all_tries.append(tries)
+        queries = self.hits + self.misses
+        coverage = self.hits / queries if queries else 0.0
+        self.reseed(own_seed)
+        self.hits, self.misses = hits + self.hits, misses + self.misses
+        return float(np.mean(all_tries)), coverage
+
+    def compress(
+        self,
+        min_count: int = 1,
+        min_state_count: int = 1,
+        min_probability: float = 0.0,
+        dominance: float = 0.0,
+        count_bits: int | None = 8,
+        benchmark_rect: Rect | None = None,
+        benchmark_grids: int = 20,
+        benchmark_seed: int = 0,
+    ) -> CompressionReport:
+        """
+        Shrink the model in place. Transitions seen fewer than min_count times
+        or with less than min_probability of their state's mass are pruned, and
+        so are states seen fewer than min_state_count times. A successor seen
+        less than dominance times the most frequent one of its state is dropped
+        as dominated. Counts of a state are then scaled so the largest fits in
+        count_bits, keeping every count at least 1.
+        With a benchmark rect, mean tries are compared before and after.
+        """
+        index = self.index
+        report = CompressionReport(
+            states_before=len(index),
+            states_after=0,
+            edges_before=len(index.targets),
+            edges_after=0,
+            bytes_before=index.nbytes,
+            bytes_after=0,
+            kept_mass=1.0,
+        )
+        if benchmark_rect is not None:
+            report.mean_tries_before, report.coverage_before = self.evaluate(
+                benchmark_rect, benchmark_grids, benchmark_seed
+            )
+
+        if len(index) > 0:
+            sizes = np.diff(index.offsets)
+            rows = np.repeat(np.arange(len(index)), sizes)
+            counts = np.asarray(index.counts, dtype=np.int64)
+            totals = np.add.reduceat(counts, index.offsets[:-1])[rows]
+            largest = np.maximum.reduceat(counts, index.offsets[:-1])[rows]
+            keep = (
+                (counts >= min_count)
+                & (totals >= min_state_count)
+                & (counts >= min_probability * totals)
+                & (counts >= dominance * largest)
+            )
+            report.kept_mass = float(counts[keep].sum() / counts.sum())
+
+            rows, counts = rows[keep], counts[keep]
+            if count_bits is not None and len(counts) > 0:
+                limit = 2**count_bits - 1
+                largest = np.zeros(len(index), dtype=np.int64)
+                np.maximum.at(largest, rows, counts)
+                largest = largest[rows]
+                scaled = np.maximum(1, np.rint(counts * limit / largest)).astype(
+                    np.int64
+                )
+                counts = np.where(largest > limit, scaled, counts)
+
+            self._index = TransitionIndex.from_edges(
+                view=self.view,
+                uids=self.uids,
+                from_keys=np.asarray(index.from_keys)[rows],
+                targets=np.asarray(index.targets)[keep],
+                counts=counts,
+            )
+            self._counts = None
+
+        report.states_after = len(self.index)
+        report.edges_after = len(self.index.targets)
+        report.bytes_after = self.index.nbytes
+        if benchmark_rect is not None:
+            report.mean_tries_after, report.coverage_after = self.evaluate(
+                benchmark_rect, benchmark_grids, benchmark_seed
+            )
+        return report
 
     def save_weights(self, filename: str) -> None:
-        with open(f"{filename}.json", "w") as f:
-            json.dump(self.graph, f, default=lambda x: dict(x))
+        """Write the successors index, see TransitionIndex for the layout."""
+        self.index.save(f"{filename}{MODEL_EXTENSION}")
 
     def load_weights(self, filename: str) -> None:
+        """
+        Memory-map weights saved by save_weights. Older JSON weights, with zlib
+        and base64 string keys, are converted with the uids of the repository.
+        """
+        if os.path.exists(f"{filename}{MODEL_EXTENSION}"):
+            index = TransitionIndex.load(f"{filename}{MODEL_EXTENSION}")
+            self.view = index.view
+            self.set_uids(index.uids)
+            self._index = index
+            self._counts = None
+            return
+
         with open(f"{filename}.json", "r") as f:
             data = json.load(f)
 
-        graph = defaultdict(lambda: defaultdict(int))
-        for key, subdict in data.items():
-            graph[key] = defaultdict(int, subdict)
-        self.graph = graph
+        self.set_uids(repository.uids)
+        counts = {
+            self.encode_state(self._decode_legacy_state(key_to)): count
+            for subdict in data.values()
+            for key_to, count in subdict.items()
+        }
+        keys = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        values = np.fromiter(counts.values(), dtype=np.int64, count=len(counts))
+        order = np.argsort(keys)
+        self._counts = CountTable(keys=keys[order], counts=values[order])
+        self._index = None
+
+    def _decode_legacy_state(self, key: str) -> np.ndarray:
+        return Utils.decode_np_array(key, shape=(self.view.width, self.view.height))
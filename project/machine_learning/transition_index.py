@@ -0,0 +1,208 @@
+import os
+from typing import Tuple
+
+import numpy as np
+
+from project.wfc.grid import Rect
+
+MAGIC = b"WFCMMC"
+FORMAT_VERSION = 1
+MODEL_EXTENSION = ".mmc"
+# every array of the file starts on a multiple of ALIGNMENT bytes
+ALIGNMENT = 8
+
+HEADER_DTYPE = np.dtype(
+    [
+        ("magic", "S8"),
+        ("version", "<u4"),
+        ("height", "<u4"),
+        ("width", "<u4"),
+        ("uid_count", "<u4"),
+        ("state_count", "<u8"),
+        ("edge_count", "<u8"),
+        # counts shrink to the smallest unsigned type that fits the largest one
+        ("count_size", "<u4"),
+        ("padding", "<u4"),
+    ]
+)
+
+
+def _aligned(offset: int) -> int:
+    """Smallest multiple of ALIGNMENT not below offset."""
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def count_dtype(counts: np.ndarray) -> np.dtype:
+    """Smallest unsigned integer type that holds all counts."""
+    largest = int(counts.max(initial=0))
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if largest <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    raise ValueError("Counts do not fit in 32 bits.")
+
+
+class TransitionIndex:
+    """
+    Successors of every state to fill in CSR form: from_keys in ascending
+    order, and for the i-th of them the successors offsets[i]:offsets[i + 1]
+    of targets (dense indices into uids) and counts, targets ascending.
+    """
+
+    def __init__(
+        self,
+        view: Rect,
+        uids: np.ndarray,
+        from_keys: np.ndarray,
+        offsets: np.ndarray,
+        targets: np.ndarray,
+        counts: np.ndarray,
+        cumulative: np.ndarray | None = None,
+    ) -> None:
+        self.view = view
+        self.uids = uids
+        self.from_keys = from_keys
+        self.offsets = offsets
+        self.targets = targets
+        self.counts = counts
+        self._cumulative = cumulative
+
+    @classmethod
+    def from_edges(
+        cls,
+        view: Rect,
+        uids: np.ndarray,
+        from_keys: np.ndarray,
+        targets: np.ndarray,
+        counts: np.ndarray,
+    ) -> "TransitionIndex":
+        """Build the index from unordered (from_key, target, count) edges."""
+        if len(targets) and (targets.min() < 0 or targets.max() >= len(uids)):
+            raise ValueError("Edges lead to targets that are not among the uids.")
+        order = np.lexsort((targets, from_keys))
+        from_keys, targets, counts = from_keys[order], targets[order], counts[order]
+        starts = np.flatnonzero(np.diff(from_keys, prepend=from_keys[:1] - 1))
+        return cls(
+            view=view,
+            uids=uids,
+            from_keys=from_keys[starts],
+            offsets=np.append(starts, len(from_keys)).astype(np.int64),
+            targets=targets.astype(np.int16),
+            counts=counts.astype(count_dtype(counts)),
+        )
+
+    def __len__(self) -> int:
+        return len(self.from_keys)
+
+    def find(self, key: int) -> int:
+        """Row of key in from_keys, -1 if it was never seen."""
+        i = int(self.from_keys.searchsorted(key))
+        if i == len(self.from_keys) or self.from_keys[i] != key:
+            return -1
+        return i
+
+    def get(self, key: int) -> Tuple[np.ndarray, np.ndarray] | None:
+        """Targets and counts of the successors of key, None if it was never seen."""
+        i = self.find(key)
+        if i < 0:
+            return None
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return self.targets[start:end], self.counts[start:end]
+
+    @property
+    def cumulative(self) -> np.ndarray:
+        """
+        Running sum of all counts, saved with the index or computed on first use.
+        The cumulative weights of row i are cumulative[start:end] minus
+        cumulative[start - 1].
+        """
+        if self._cumulative is None:
+            self._cumulative = np.cumsum(self.counts, dtype=np.int64)
+        return self._cumulative
+
+    @property
+    def nbytes(self) -> int:
+        return sum(
+            array.nbytes
+            for array in (self.from_keys, self.offsets, self.targets, self.counts)
+        )
+
+    def save(self, path: str) -> None:
+        """
+        Write the header, then uids, from_keys, offsets, cumulative, counts and
+        targets, each padded to ALIGNMENT bytes.
+        """
+        header = np.zeros(1, dtype=HEADER_DTYPE)
+        header["magic"] = MAGIC
+        header["version"] = FORMAT_VERSION
+        header["height"] = self.view.height
+        header["width"] = self.view.width
+        header["uid_count"] = len(self.uids)
+        header["state_count"] = len(self.from_keys)
+        header["edge_count"] = len(self.targets)
+        counts = np.asarray(
+            self.counts, dtype=count_dtype(self.counts).newbyteorder("<")
+        )
+        header["count_size"] = counts.itemsize
+        arrays = [
+            header,
+            np.asarray(self.uids, dtype="<i8"),
+            np.asarray(self.from_keys, dtype="<i8"),
+            np.asarray(self.offsets, dtype="<i8"),
+            np.asarray(self.cumulative, dtype="<i8"),
+            counts,
+            np.asarray(self.targets, dtype="<i2"),
+        ]
+        with open(path, "wb") as f:
+            for array in arrays:
+                array.tofile(f)
+                f.write(bytes(_aligned(array.nbytes) - array.nbytes))
+
+    @classmethod
+    def load(cls, path: str) -> "TransitionIndex":
+        """
+        Memory-map a saved index. Nothing is read until it is queried, and
+        processes that load the same file share its pages.
+        """
+        header = np.fromfile(path, dtype=HEADER_DTYPE, count=1)
+        if len(header) == 0 or header["magic"][0] != MAGIC:
+            raise ValueError(f"{path} is not a ModelMC weights file.")
+        if header["version"][0] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported weights version {header['version'][0]}.")
+        states = int(header["state_count"][0])
+        edges = int(header["edge_count"][0])
+
+        layout = [
+            ("uids", "<i8", int(header["uid_count"][0])),
+            ("from_keys", "<i8", states),
+            ("offsets", "<i8", states + 1),
+            ("cumulative", "<i8", edges),
+            ("counts", f"<u{int(header['count_size'][0])}", edges),
+            ("targets", "<i2", edges),
+        ]
+
+        starts = [_aligned(header.dtype.itemsize)]
+        for _, dtype, count in layout:
+            starts.append(_aligned(starts[-1] + count * np.dtype(dtype).itemsize))
+        if starts[-1] != os.path.getsize(path):
+            raise ValueError(f"{path} is truncated or has trailing data.")
+
+        arrays = {}
+        for (name, dtype, count), offset in zip(layout, starts):
+            if count > 0:
+                mapped = np.memmap(
+                    path, dtype=dtype, mode="r", offset=offset, shape=(count,)
+                )
+                # a plain ndarray over the map, memmap methods are slow on scalars
+                arrays[name] = mapped.view(np.ndarray)
+            else:
+                arrays[name] = np.zeros(0, dtype=dtype)
+
+        return cls(
+            view=Rect(width=int(header["width"][0]), height=int(header["height"][0])),
+            uids=np.array(arrays["uids"]),
+            from_keys=arrays["from_keys"],
+            offsets=arrays["offsets"],
+            targets=arrays["targets"],
+            counts=arrays["counts"],
+            cumulative=arrays["cumulative"],
+        )
@@ -0,0 +1,278 @@
+"""
+Benchmark generation throughput and tries-to-success.
+
+    python -m project.utils.benchmark --sizes 5 10 --judges random mc \
+        --output benchmark.json --baseline baseline.json
+
+Every grid is generated from its own seed derived from --seed, so runs with
+the same arguments are comparable. With --baseline, results that got slower
+or need more tries than the tolerance allows are flagged as regressions.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+
+from project.logger import logger
+from project.machine_learning.agent_rl import AgentRL
+from project.machine_learning.model import ModelMode
+from project.machine_learning.model_mc import ModelMC
+from project.utils.sampling import derive_seed
+from project.wfc.corpus import CORPUS_EXTENSION, CorpusWriter
+from project.wfc.factory import Factory
+from project.wfc.grid import EntropyHeuristic, Grid, Propagation, Rect
+from project.wfc.judge import GreedyJudge, Judge, RandomJudge
+from project.wfc.pattern import MetaPattern
+from project.wfc.profiler import Profiler
+from project.wfc.wfc import WFC
+
+TILESETS_PATH = "data/patterns/patterns_{name}.json"
+JUDGES = ("random", "greedy", "mc", "rl")
+
+
+@dataclass
+class BenchmarkResult:
+    tileset: str
+    size: int
+    judge: str
+    propagation: str
+    heuristic: str
+    grids: int
+    failed: int
+    mean_tries: float
+    grids_per_second: float
+    steps_per_second: float
+    p50_time: float
+    p99_time: float
+    peak_memory_kb: float
+    profile: dict
+
+    @property
+    def key(self) -> Tuple[str, int, str, str, str]:
+        return self.tileset, self.size, self.judge, self.propagation, self.heuristic
+
+
+def train_model_mc(
+    patterns: List[MetaPattern], grids: int, rect: Rect, seed: int
+) -> ModelMC:
+    """Train a ModelMC on a corpus generated with RandomJudge."""
+    wfc = WFC(grid=Grid(patterns=patterns, rect=rect), judge=RandomJudge())
+    uids = np.array(sorted(pattern.uid for pattern in patterns), dtype=np.int64)
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, f"train{CORPUS_EXTENSION}")
+        with CorpusWriter(path, uids=uids, rect=rect) as writer:
+            for index in range(grids):
+                wfc.judge.reseed(derive_seed(seed, index))
+                while not wfc.generate():
+                    pass
+                writer.append_grid(wfc.grid)
+        model = ModelMC(seed=seed)
+        model.train(path)
+    return model
+
+
+def make_judge_factory(
+    name: str, patterns: List[MetaPattern], args: argparse.Namespace
+) -> Callable[[], Judge]:
+    if name == "random":
+        return RandomJudge
+    if name == "greedy":
+        return GreedyJudge
+    if name == "mc":
+        if args.mc_weights:
+            model = ModelMC(seed=args.seed)
+            model.load_weights(args.mc_weights)
+        else:
+            model = train_model_mc(
+                patterns, args.mc_grids, Rect(args.mc_size, args.mc_size), args.seed
+            )
+        return lambda: model
+    if name == "rl":
+        agent = AgentRL(wfc=None, mode=ModelMode.EVALUATION)
+        if args.rl_weights:
+            agent.load_weights(args.rl_weights)
+        return lambda: agent
+    raise ValueError(f"Unknown judge {name}.")
+
+
+def generate(wfc: WFC, max_tries: int) -> Tuple[bool, int]:
+    """Generate one grid, restarting until success or max_tries."""
+    for tries in range(1, max_tries + 1):
+        if wfc.generate():
+            return True, tries
+    return False, max_tries
+
+
+def run_benchmark(
+    tileset: str,
+    patterns: List[MetaPattern],
+    size: int,
+    judge_name: str,
+    judge_factory: Callable[[], Judge],
+    args: argparse.Namespace,
+) -> BenchmarkResult:
+    rect = Rect(width=size, height=size)
+    propagation = Propagation[args.propagation.upper()]
+    heuristic = EntropyHeuristic[args.heuristic.upper()]
+    profiler = Profiler()
+    grid = Grid(patterns=patterns, rect=rect, propagation=propagation)
+    wfc = WFC(grid=grid, judge=judge_factory(), heuristic=heuristic)
+    if isinstance(wfc.judge, AgentRL):
+        wfc.judge.wfc = wfc
+
+    # one try is measured under tracemalloc on its own, it slows everything down
+    tracemalloc.start()
+    wfc.judge.reseed(derive_seed(args.seed, 0))
+    generate(wfc, max_tries=1)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    wfc.profiler = profiler
+    times, all_tries, failed = [], [], 0
+    start = time.perf_counter()
+    for index in range(args.grids):
+        wfc.judge.reseed(derive_seed(args.seed, index))
+        grid_start = time.perf_counter()
+        success, tries = generate(wfc, args.max_tries)
+        all_tries.append(tries)
+        if success:
+            times.append(time.perf_counter() - grid_start)
+        else:
+            failed += 1
+    elapsed = time.perf_counter() - start
+
+    steps = sum(profiler.outcomes.values())
+    return BenchmarkResult(
+        tileset=tileset,
+        size=size,
+        judge=judge_name,
+        propagation=propagation.name,
+        heuristic=heuristic.name,
+        grids=args.grids - failed,
+        failed=failed,
+        mean_tries=float(np.mean(all_tries)),
+        grids_per_second=(args.grids - failed) / elapsed,
+        steps_per_second=steps / elapsed,
+        p50_time=float(np.percentile(times, 50)) if times else float("nan"),
+        p99_time=float(np.percentile(times, 99)) if times else float("nan"),
+        peak_memory_kb=peak_memory / 1024,
+        profile=profiler.summary(),
+    )
+
+
+def compare(
+    results: List[BenchmarkResult], baseline: List[dict], tolerance: float
+) -> List[str]:
+    """Describe the results that regressed against the baseline."""
+    baseline_by_key: Dict[tuple, dict] = {
+        (
+            r["tileset"],
+            r["size"],
+            r["judge"],
+            r["propagation"],
+            r["heuristic"],
+        ): r
+        for r in baseline
+    }
+    regressions = []
+    for result in results:
+        reference = baseline_by_key.get(result.key)
+        if reference is None:
+            continue
+        name = "/".join(map(str, result.key))
+        if result.grids_per_second < reference["grids_per_second"] * (1 - tolerance):
+            regressions.append(
+                f"{name}: {result.grids_per_second:.2f} grids/s, "
+                f"baseline {reference['grids_per_second']:.2f}"
+            )
+        if result.mean_tries > reference["mean_tries"] * (1 + tolerance):
+            regressions.append(
+                f"{name}: {result.mean_tries:.2f} tries, "
+                f"baseline {reference['mean_tries']:.2f}"
+            )
+    return regressions
+
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 10])
+    parser.add_argument("--tilesets", nargs="+", default=["forest", "desert"])
+    parser.add_argument("--judges", nargs="+", choices=JUDGES, default=["random"])
+    parser.add_argument("--grids", type=int, default=20, help="grids per setup")
+    parser.add_argument("--max-tries", type=int, default=1000)
+    parser.add_argument(
+        "--propagation", choices=["neighbors", "full"], default="neighbors"
+    )
+    parser.add_argument("--heuristic", choices=["count", "shannon"], default="count")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mc-weights", help="ModelMC weights, trained if not set")
+    parser.add_argument("--mc-grids", type=int, default=50)
+    parser.add_argument("--mc-size", type=int, default=6)
+    parser.add_argument("--rl-weights", help="AgentRL Q-table, empty if not set")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON file of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    return parser.parse_args(argv)
+
+
+def main(argv: List[str] | None = None) -> int:
+    args = parse_args(argv)
+    results = []
+    for tileset in args.tilesets:
+        path = (
+            tileset if tileset.endswith(".json") else TILESETS_PATH.format(name=tileset)
+        )
+        patterns = Factory(path).create_patterns()
+        for judge_name in args.judges:
+            judge_factory = make_judge_factory(judge_name, patterns, args)
+            for size in args.sizes:
+                result = run_benchmark(
+                    tileset, patterns, size, judge_name, judge_factory, args
+                )
+                logger.info(
+                    f"{tileset} {size}x{size} {judge_name}: "
+                    f"{result.grids_per_second:.2f} grids/s, "
+                    f"{result.steps_per_second:.0f} steps/s, "
+                    f"p50 {result.p50_time * 1000:.1f}ms, "
+                    f"p99 {result.p99_time * 1000:.1f}ms, "
+                    f"{result.mean_tries:.2f} tries, {result.failed} failed, "
+                    f"peak {result.peak_memory_kb:.0f}KB"
+                )
+                results.append(result)
+
+    if args.output:
+        report = {
+            "meta": {
+                "args": vars(args),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+                "platform": platform.platform(),
+            },
+            "results": [asdict(result) for result in results],
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            logger.warning(f"Regression {regression}")
+        if regressions:
+            return 1
+        logger.info("No regressions against the baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+from collections import OrderedDict
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from project.wfc.wobj import WeightedObject
+
+
+class AliasTable:
+    """Vose alias table: O(1) draws from a fixed discrete distribution."""
+
+    def __init__(self, weights: Sequence[float]) -> None:
+        weights = np.asarray(weights, dtype=float)
+        if len(weights) == 0 or weights.sum() <= 0:
+            raise ValueError("Weights must contain a positive value.")
+        n = len(weights)
+        scaled = weights * n / weights.sum()
+        prob, alias = [1.0] * n, list(range(n))
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            prob[less], alias[less] = float(scaled[less]), more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+        # leftovers are 1 up to rounding errors
+        self.prob = prob
+        self.alias = alias
+
+    def __len__(self) -> int:
+        return len(self.prob)
+
+    def sample(self, random: np.random.Generator) -> int:
+        """Draw one index with a single uniform number."""
+        u = random.random() * len(self.prob)
+        i = int(u)
+        return i if u - i < self.prob[i] else self.alias[i]
+
+    def sample_many(self, random: np.random.Generator, size: int) -> np.ndarray:
+        """Draw size indices at once."""
+        u = random.random(size) * len(self.prob)
+        i = u.astype(np.int64)
+        return np.where(u - i < np.take(self.prob, i), i, np.take(self.alias, i))
+
+
+class AliasCache:
+    """Alias tables of recently used weight vectors, evicted least recently used."""
+
+    def __init__(self, size: int = 1024) -> None:
+        self.size = size
+        self.tables: OrderedDict[Tuple[float, ...], AliasTable] = OrderedDict()
+
+    def get(self, weights: Tuple[float, ...]) -> AliasTable:
+        table = self.tables.get(weights)
+        if table is not None:
+            self.tables.move_to_end(weights)
+            return table
+        table = AliasTable(weights)
+        self.tables[weights] = table
+        if len(self.tables) > self.size:
+            self.tables.popitem(last=False)
+        return table
+
+
+# tables depend on the weights only, so they are shared by all samplers
+alias_cache = AliasCache()
+
+
+def derive_seed(seed: int | None, *key: int) -> int:
+    """
+    Seed of the stream at key under seed, e.g. of the i-th grid of a run.
+    Keys give independent streams, whatever order they are used in.
+    """
+    sequence = np.random.SeedSequence(entropy=seed, spawn_key=key)
+    return int(sequence.generate_state(1)[0])
+
+
+class Sampler:
+    """
+    Weighted sampling from one long-lived generator.
+    The whole stream is determined by the seed, so a run that draws through one
+    sampler is reproducible from start to end.
+    """
+
+    def __init__(self, seed: int | None = None, cache: AliasCache = alias_cache):
+        self.cache = cache
+        self.reseed(seed)
+
+    def reseed(self, seed: int | None) -> None:
+        """Restart the stream from a new seed."""
+        self.seed = seed
+        self.random = np.random.default_rng(seed)
+
+    def choice_index(self, weights: Tuple[float, ...]) -> int:
+        """Draw an index with probability proportional to its weight."""
+        if len(weights) == 1:
+            return 0
+        return self.cache.get(weights).sample(self.random)
+
+    def choice(self, objects: List[WeightedObject]) -> WeightedObject:
+        """Draw an object with probability proportional to its weight."""
+        return objects[self.choice_index(tuple(obj.weight for obj in objects))]
@@ -4,21 +4,27 @@ from typing import List, Tuple
 
 import numpy as np
 
+from project.utils.sampling import alias_cache
 from project.wfc.wobj import WeightedObject
 
 
 class Utils:
     @staticmethod
     def weighted_choice(
-        objects: List[WeightedObject], seed: int = None
+        objects: List[WeightedObject],
+        seed: int = None,
+        random_gen: np.random.Generator | None = None,
     ) -> WeightedObject:
-        """Select a weighted object based on its weight."""
-        random_gen = np.random.RandomState(seed)
-
-        weights = np.array([obj.weight for obj in objects])
-        probabilities = weights / np.sum(weights)
-
-        return random_gen.choice(objects, p=probabilities)
+        """
+        Select a weighted object based on its weight.
+        Draws from random_gen if given, otherwise from a new generator seeded with seed.
+        Prefer a long-lived Sampler for repeated draws.
+        """
+        if random_gen is None:
+            random_gen = np.random.default_rng(seed)
+
+        table = alias_cache.get(tuple(obj.weight for obj in objects))
+        return objects[table.sample(random_gen)]
 
     @staticmethod
     def encode_np_array(arr: np.ndarray) -> str:
@@ -2,10 +2,9 @@ from enum import Enum, auto
 
 import matplotlib.pyplot as plt
 
-from project.utils.utils import Utils
+from project.utils.sampling import Sampler
 from project.visualization.renderer import Renderer
 from project.wfc.grid import Grid
-from project.wfc.pattern import MetaPattern
 
 
 class TextToShow(Enum):
@@ -29,6 +28,7 @@ class GridRenderer(Renderer):
         show_image: bool = True,
     ) -> None:
         """Draw the grid using images for the patterns."""
+        sampler = Sampler(seed)
         fig, ax = plt.subplots(
             grid.height,
             grid.width,
@@ -44,7 +44,6 @@ class GridRenderer(Renderer):
             image = None
             background_color = None
             text_color = "black"
-            meta_pattern: MetaPattern | None = grid.grid[x, y]
 
             if text_to_show == TextToShow.ENTROPY:
                 text = str(grid.entropy[x, y])
@@ -56,8 +55,7 @@ class GridRenderer(Renderer):
                 background_color = "white" if text == "1" else "black"
                 text_color = "black" if text == "1" else "white"
             if meta_pattern and show_image:
-                custom_seed = (lambda s: s + x * 100 + y + y**2 if s else None)(seed)
-                pattern = Utils.weighted_choice(meta_pattern.patterns, seed=custom_seed)
+                pattern = sampler.choice(meta_pattern.patterns)
                 image = pattern.image_path
 
             self.render_cell(
@@ -0,0 +1,157 @@
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+
+from project.wfc.direction import Direction, direction_indices, direction_offsets
+from project.wfc.grid import EMPTY_CELL, Grid, Rect
+from project.wfc.judge import GreedyJudge, Judge, RandomJudge
+from project.wfc.pattern import MetaPattern
+from project.wfc.rules import CompiledRuleSet
+
+
+@dataclass
+class BatchResult:
+    """Collapsed grids as dense pattern indices together with generation stats."""
+
+    grids: np.ndarray
+    tries: np.ndarray
+    steps: int = 0
+
+
+class BatchWFC:
+    """
+    Advance many independent grids in lock-step.
+    Every step selects the lowest entropy cell, collapses it and narrows its
+    neighbors for all grids at once, with the same rules and tie-breaks as WFC
+    on a Grid with one-ring propagation. Collapsed and failed grids are reset
+    in place, so the batch stays full until enough grids are collected.
+    """
+
+    def __init__(
+        self,
+        patterns: List[MetaPattern],
+        judge: Judge,
+        rect: Rect = Rect(width=3, height=3),
+        batch_size: int = 256,
+    ) -> None:
+        if not isinstance(judge, (RandomJudge, GreedyJudge)):
+            raise ValueError("BatchWFC supports only RandomJudge and GreedyJudge.")
+        self.width = rect.width
+        self.height = rect.height
+        self.batch_size = batch_size
+        self.judge = judge
+        self.rules = CompiledRuleSet.from_patterns(patterns)
+        self.weights = np.array([p.weight for p in self.rules.patterns], dtype=float)
+
+        # rank of every cell in the (distance to center, x, y) tie-break order
+        xs, ys = np.indices((self.height, self.width))
+        distance = (xs - self.height // 2) ** 2 + (ys - self.width // 2) ** 2
+        order = np.lexsort((ys.ravel(), xs.ravel(), distance.ravel()))
+        self._tie_rank = np.empty(self.height * self.width, dtype=np.int64)
+        self._tie_rank[order] = np.arange(self.height * self.width)
+
+        self.initialize()
+
+    def initialize(self) -> None:
+        """Reset all grids of the batch to full entropy."""
+        shape = (self.batch_size, self.height, self.width)
+        self.grids = np.full(shape, EMPTY_CELL, dtype=np.int16)
+        self.entropy = np.full(shape, len(self.rules), dtype=np.int32)
+        self.wave = np.ones((*shape, len(self.rules)), dtype=bool)
+        self.tries = np.ones(self.batch_size, dtype=np.int64)
+
+    def _reset(self, mask: np.ndarray) -> None:
+        """Reset the selected grids in place."""
+        self.grids[mask] = EMPTY_CELL
+        self.entropy[mask] = len(self.rules)
+        self.wave[mask] = True
+
+    def _select_cells(self) -> np.ndarray:
+        """Flat index of the lowest entropy cell of every grid, -1 if collapsed."""
+        entropy = self.entropy.reshape(self.batch_size, -1).astype(np.int64)
+        score = entropy * entropy.shape[1] + self._tie_rank
+        score[entropy == 0] = np.iinfo(np.int64).max
+        cells = np.argmin(score, axis=1)
+        cells[np.all(entropy == 0, axis=1)] = -1
+        return cells
+
+    def _choose_patterns(self, options: np.ndarray) -> np.ndarray:
+        """Choose a pattern index for every row of an (N, P) option mask."""
+        weights = np.where(options, self.weights, 0.0)
+        if isinstance(self.judge, GreedyJudge):
+            weights[~options] = -np.inf
+            return np.argmax(weights, axis=1)
+        cumulative = np.cumsum(weights, axis=1)
+        thresholds = self.judge.random.random(len(options)) * cumulative[:, -1]
+        chosen = np.sum(cumulative <= thresholds[:, None], axis=1)
+        return np.minimum(chosen, len(self.rules) - 1)
+
+    def step(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Collapse one cell in every grid.
+        Returns masks of the grids that are fully collapsed and that failed.
+        """
+        cells = self._select_cells()
+        collapsed = cells < 0
+        active = np.flatnonzero(~collapsed)
+        xs, ys = np.divmod(cells[active], self.width)
+
+        chosen = self._choose_patterns(self.wave[active, xs, ys])
+        self.grids[active, xs, ys] = chosen
+        self.entropy[active, xs, ys] = 0
+        self.wave[active, xs, ys] = False
+        self.wave[active, xs, ys, chosen] = True
+
+        failed = np.zeros(self.batch_size, dtype=bool)
+        for direction in Direction:
+            dx, dy = direction_offsets[direction]
+            nx, ny = xs + dx, ys + dy
+            inside = (0 <= nx) & (nx < self.height) & (0 <= ny) & (ny < self.width)
+            grids, nx, ny = active[inside], nx[inside], ny[inside]
+            empty = self.grids[grids, nx, ny] == EMPTY_CELL
+            grids, nx, ny = grids[empty], nx[empty], ny[empty]
+            allowed = self.rules.compatibility[direction_indices[direction]]
+            self.wave[grids, nx, ny] &= allowed[chosen[inside][empty]]
+            entropy = np.count_nonzero(self.wave[grids, nx, ny], axis=1)
+            self.entropy[grids, nx, ny] = entropy
+            failed[grids[entropy == 0]] = True
+
+        return collapsed, failed
+
+    def generate(self, count: int, max_steps: int | None = None) -> BatchResult:
+        """Run the batch until count grids are collapsed."""
+        self.initialize()
+        grids, tries = [], []
+        collected, steps = 0, 0
+        while collected < count and (max_steps is None or steps < max_steps):
+            collapsed, failed = self.step()
+            steps += 1
+            done = np.flatnonzero(collapsed)[: count - collected]
+            if len(done):
+                grids.append(self.grids[done].copy())
+                tries.append(self.tries[done].copy())
+                collected += len(done)
+            self.tries[collapsed] = 1
+            self.tries[failed] += 1
+            self._reset(collapsed | failed)
+
+        return BatchResult(
+            grids=(
+                np.concatenate(grids)
+                if grids
+                else np.empty((0, self.height, self.width), dtype=np.int16)
+            ),
+            tries=np.concatenate(tries) if tries else np.empty(0, dtype=np.int64),
+            steps=steps,
+        )
+
+    def to_grid(self, indices: np.ndarray) -> Grid:
+        """Build a collapsed Grid from an array of dense pattern indices."""
+        grid = Grid(
+            patterns=self.rules.patterns,
+            rect=Rect(width=self.width, height=self.height),
+        )
+        grid.indices[:] = indices
+        grid.entropy[indices != EMPTY_CELL] = 0
+        return grid
@@ -0,0 +1,210 @@
+import os
+from typing import Iterable, Tuple
+
+import numpy as np
+
+from project.config import HIDDEN_CELL
+from project.wfc.grid import EMPTY_CELL, Grid, Rect
+from project.wfc.repository import Repository
+
+MAGIC = b"WFCCORP"
+FORMAT_VERSION = 1
+JUDGE_NAME_SIZE = 32
+NO_SEED = -1
+CORPUS_EXTENSION = ".corpus"
+
+HEADER_DTYPE = np.dtype(
+    [
+        ("magic", "S8"),
+        ("version", "<u4"),
+        ("height", "<u4"),
+        ("width", "<u4"),
+        ("uid_count", "<u4"),
+    ]
+)
+
+
+def record_dtype(rect: Rect) -> np.dtype:
+    """One grid of the corpus: dense indices into the uid table and metadata."""
+    return np.dtype(
+        [
+            ("seed", "<i8"),
+            ("tries", "<u4"),
+            ("judge", f"S{JUDGE_NAME_SIZE}"),
+            ("grid", "<i2", (rect.height, rect.width)),
+        ]
+    )
+
+
+def _read_header(path: str) -> Tuple[Rect, np.ndarray, int]:
+    """Rect, uid table and offset of the first record of a corpus file."""
+    with open(path, "rb") as f:
+        header = np.fromfile(f, dtype=HEADER_DTYPE, count=1)
+        if len(header) == 0 or header["magic"][0] != MAGIC:
+            raise ValueError(f"{path} is not a corpus file.")
+        if header["version"][0] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported corpus version {header['version'][0]}.")
+        uids = np.fromfile(f, dtype="<i8", count=int(header["uid_count"][0]))
+    rect = Rect(width=int(header["width"][0]), height=int(header["height"][0]))
+    return rect, uids, HEADER_DTYPE.itemsize + uids.nbytes
+
+
+def _indices_of(uids: np.ndarray, table: np.ndarray, source: str) -> np.ndarray:
+    """
+    Dense indices of uids into a sorted uid table, EMPTY_CELL for hidden cells.
+    Raises ValueError naming the placed uids that are not in the table.
+    """
+    indices = np.searchsorted(table, uids)
+    placed = uids != HIDDEN_CELL
+    known = indices < len(table)
+    known[known] = table[indices[known]] == uids[known]
+    if not known[placed].all():
+        unknown = np.unique(uids[placed & ~known]).tolist()
+        raise ValueError(f"{source} holds uids {unknown} missing from the corpus.")
+    return np.where(placed, indices, EMPTY_CELL)
+
+
+class CorpusWriter:
+    """
+    Append grids to a corpus file: a header, the uid table and fixed-size
+    records. Grids are stored as dense indices into the uid table, -1 for
+    empty cells. An existing file is appended to if its layout matches.
+    """
+
+    def __init__(self, path: str, uids: np.ndarray, rect: Rect) -> None:
+        self.path = path
+        self.rect = rect
+        self.uids = np.asarray(uids, dtype=np.int64)
+        self.dtype = record_dtype(rect)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            file_rect, file_uids, offset = _read_header(path)
+            if file_rect != rect or not np.array_equal(file_uids, self.uids):
+                raise ValueError(f"{path} holds a corpus of another layout.")
+            self._file = open(path, "r+b")
+            # drop a record left incomplete by an interrupted writer
+            count = (os.path.getsize(path) - offset) // self.dtype.itemsize
+            self._file.truncate(offset + count * self.dtype.itemsize)
+            self._file.seek(0, os.SEEK_END)
+        else:
+            self._file = open(path, "wb")
+            header = np.zeros(1, dtype=HEADER_DTYPE)
+            header["magic"] = MAGIC
+            header["version"] = FORMAT_VERSION
+            header["height"], header["width"] = rect.height, rect.width
+            header["uid_count"] = len(self.uids)
+            self._file.write(header.tobytes())
+            self._file.write(self.uids.astype("<i8").tobytes())
+
+    def append(
+        self,
+        indices: np.ndarray,
+        seed: int | None = None,
+        judge: str = "",
+        tries: int = 1,
+    ) -> None:
+        """Append a grid of dense indices into the uid table."""
+        record = np.zeros(1, dtype=self.dtype)
+        record["grid"] = indices
+        record["seed"] = NO_SEED if seed is None else seed
+        record["judge"] = judge.encode()[:JUDGE_NAME_SIZE]
+        record["tries"] = tries
+        self._file.write(record.tobytes())
+
+    def append_grid(
+        self, grid: Grid, seed: int | None = None, judge: str = "", tries: int = 1
+    ) -> None:
+        """Append the cells of a Grid built on patterns from the uid table."""
+        self.append(
+            _indices_of(grid.get_properties(), self.uids, "Grid"),
+            seed=seed,
+            judge=judge,
+            tries=tries,
+        )
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> "CorpusWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+class Corpus:
+    """Read-only, memory-mapped view of a corpus file."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.rect, self.uids, offset = _read_header(path)
+        dtype = record_dtype(self.rect)
+        count = (os.path.getsize(path) - offset) // dtype.itemsize
+        if count > 0:
+            self.records = np.memmap(
+                path, dtype=dtype, mode="r", offset=offset, shape=(count,)
+            )
+        else:
+            self.records = np.zeros(0, dtype=dtype)
+        # dense index -> uid, the last entry maps EMPTY_CELL to HIDDEN_CELL
+        self._uid_table = np.append(self.uids, HIDDEN_CELL)
+        # corpus index -> grid index for the rules load_into last saw
+        self._index_rules = None
+        self._index_table: np.ndarray | None = None
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    @property
+    def grids(self) -> np.ndarray:
+        """(count, height, width) dense indices of all grids."""
+        return self.records["grid"]
+
+    @property
+    def seeds(self) -> np.ndarray:
+        return self.records["seed"]
+
+    @property
+    def tries(self) -> np.ndarray:
+        return self.records["tries"]
+
+    def get_judge(self, i: int) -> str:
+        return self.records["judge"][i].decode()
+
+    def get_uids(self, i: int) -> np.ndarray:
+        """Uids of the grid at i, HIDDEN_CELL for empty cells."""
+        return self._uid_table[self.grids[i]]
+
+    def load_into(self, grid: Grid, i: int) -> None:
+        """Set the cells of a Grid to the grid at i."""
+        if grid.rules is not self._index_rules:
+            # the last entry keeps EMPTY_CELL empty
+            self._index_table = np.array(
+                [grid.rules.index_by_uid[int(uid)] for uid in self.uids] + [EMPTY_CELL]
+            )
+            self._index_rules = grid.rules
+        grid.height, grid.width = self.rect.height, self.rect.width
+        grid.indices = self._index_table[self.grids[i]]
+
+
+def import_dat_files(
+    dat_paths: Iterable[str], path: str, repository: Repository
+) -> int:
+    """Pack .dat grids written by Grid.serialize into a corpus file."""
+    writer, count = None, 0
+    try:
+        for dat_path in dat_paths:
+            uids = np.loadtxt(dat_path, delimiter=",", dtype=np.int64, ndmin=2)
+            if writer is None:
+                rect = Rect(width=uids.shape[1], height=uids.shape[0])
+                writer = CorpusWriter(path, uids=repository.uids, rect=rect)
+            if uids.shape != (writer.rect.height, writer.rect.width):
+                raise ValueError(f"{dat_path} does not match the corpus size.")
+            writer.append(_indices_of(uids, writer.uids, dat_path))
+            count += 1
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
@@ -0,0 +1,166 @@
+import os
+import time
+from dataclasses import dataclass
+from multiprocessing import Pool
+from typing import Callable, Iterator, Tuple
+
+import numpy as np
+from tqdm import tqdm
+
+from project.config import DATA_SOURCE, HIDDEN_CELL
+from project.logger import logger
+from project.utils.sampling import derive_seed
+from project.wfc.corpus import CORPUS_EXTENSION, CorpusWriter
+from project.wfc.factory import Factory
+from project.wfc.grid import Grid, Propagation, Rect
+from project.wfc.judge import Judge, RandomJudge
+from project.wfc.wfc import WFC
+
+
+@dataclass
+class CorpusStats:
+    grids: int = 0
+    failed: int = 0
+    tries: int = 0
+    elapsed: float = 0.0
+
+    @property
+    def grids_per_second(self) -> float:
+        return self.grids / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def mean_tries(self) -> float:
+        return self.tries / self.grids if self.grids > 0 else 0.0
+
+
+# state of a pool worker, built once by _initialize_worker
+_worker_wfc: WFC | None = None
+
+
+def _initialize_worker(
+    json_path: str,
+    rect: Rect,
+    propagation: Propagation,
+    judge_factory: Callable[[], Judge],
+) -> None:
+    """Load the tileset and build the worker's own grid and judge."""
+    global _worker_wfc
+    patterns = Factory(json_path).create_patterns()
+    grid = Grid(patterns=patterns, rect=rect, propagation=propagation)
+    _worker_wfc = WFC(grid=grid, judge=judge_factory())
+
+
+def _generate_grid(
+    task: Tuple[int, int, int | None],
+) -> Tuple[int, np.ndarray | None, int]:
+    """
+    Generate one grid from its own seed, retrying until success or max_tries.
+    Returns the dense pattern indices of the grid.
+    """
+    index, seed, max_tries = task
+    _worker_wfc.judge.reseed(seed)
+    tries = 0
+    while max_tries is None or tries < max_tries:
+        tries += 1
+        if _worker_wfc.generate():
+            return index, _worker_wfc.grid.get_indices(), tries
+    return index, None, tries
+
+
+class CorpusGenerator:
+    """
+    Generate a corpus of grids on a process pool.
+    Every grid gets a seed derived from the corpus seed and its index, so the
+    corpus does not depend on the number of workers or on scheduling order.
+    Grids are written to disk as soon as a worker returns them, either into
+    one corpus file or as a .dat file per grid.
+    """
+
+    def __init__(
+        self,
+        json_path: str = DATA_SOURCE,
+        rect: Rect = Rect(width=10, height=10),
+        judge_factory: Callable[[], Judge] = RandomJudge,
+        propagation: Propagation = Propagation.NEIGHBORS,
+        workers: int | None = None,
+        seed: int = 0,
+    ) -> None:
+        self.json_path = json_path
+        self.rect = rect
+        self.judge_factory = judge_factory
+        self.propagation = propagation
+        self.workers = workers or os.cpu_count()
+        self.seed = seed
+
+    def grid_seed(self, index: int) -> int:
+        """Seed of the grid at index, independent of how the work is split."""
+        return derive_seed(self.seed, index)
+
+    def _tasks(
+        self, count: int, max_tries: int | None
+    ) -> Iterator[Tuple[int, int, int | None]]:
+        for index in range(count):
+            yield index, self.grid_seed(index), max_tries
+
+    def generate(
+        self,
+        count: int,
+        path: str,
+        max_tries: int | None = None,
+        chunksize: int = 8,
+    ) -> CorpusStats:
+        """
+        Generate count grids. If path ends with CORPUS_EXTENSION the grids are
+        appended to that corpus file in index order, otherwise each one is saved
+        to the path directory as <index>.dat.
+        """
+        stats = CorpusStats()
+        start = time.perf_counter()
+        patterns = Factory(self.json_path).create_patterns()
+        uids = np.array(sorted(pattern.uid for pattern in patterns), dtype=np.int64)
+        writer = None
+        if path.endswith(CORPUS_EXTENSION):
+            writer = CorpusWriter(path, uids=uids, rect=self.rect)
+        else:
+            os.makedirs(path, exist_ok=True)
+        uid_table = np.append(uids, HIDDEN_CELL)
+        judge_name = getattr(self.judge_factory, "__name__", "")
+
+        with Pool(
+            processes=self.workers,
+            initializer=_initialize_worker,
+            initargs=(self.json_path, self.rect, self.propagation, self.judge_factory),
+        ) as pool:
+            results = pool.imap(
+                _generate_grid, self._tasks(count, max_tries), chunksize=chunksize
+            )
+            for index, indices, tries in tqdm(results, total=count):
+                stats.tries += tries
+                if indices is None:
+                    stats.failed += 1
+                    continue
+                if writer is not None:
+                    writer.append(
+                        indices,
+                        seed=self.grid_seed(index),
+                        judge=judge_name,
+                        tries=tries,
+                    )
+                else:
+                    # save_properties prefixes the name with path as is
+                    Grid.save_properties(
+                        properties=uid_table[indices],
+                        path=os.path.join(path, ""),
+                        name=f"{index:06d}",
+                    )
+                stats.grids += 1
+        if writer is not None:
+            writer.close()
+
+        stats.elapsed = time.perf_counter() - start
+        logger.info(
+            f"Generated {stats.grids} grids ({stats.failed} failed) in "
+            f"{stats.elapsed:.1f}s: {stats.grids_per_second:.1f} grids/s, "
+            f"{stats.mean_tries:.2f} tries per grid"
+        )
+        return stats
@@ -14,3 +14,12 @@ reverse_directions = {
     Direction.LEFT: Direction.RIGHT,
     Direction.RIGHT: Direction.LEFT,
 }
+
+direction_indices = {direction: i for i, direction in enumerate(Direction)}
+
+direction_offsets = {
+    Direction.UP: (-1, 0),
+    Direction.DOWN: (1, 0),
+    Direction.LEFT: (0, -1),
+    Direction.RIGHT: (0, 1),
+}
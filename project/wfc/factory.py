@@ -1,27 +1,60 @@
+import hashlib
 import json
+import os
 from typing import Dict, List, Union
 
 from project.logger import logger
 from project.wfc.pattern import MetaPattern, Pattern
 from project.wfc.repository import ValidationResult, repository
 from project.wfc.rules import NeighborRuleSet
+from project.wfc.tileset import CompiledTileset
 
 
 class Factory:
     def __init__(self, json_path: str) -> None:
-        with open(json_path, "r") as f:
-            data = json.load(f)
-            self.images_folder = data["images_folder"]
-            self.data = data["patterns"]
+        with open(json_path, "rb") as f:
+            raw_data = f.read()
+        self.source_hash = hashlib.sha256(raw_data).hexdigest()
+        data = json.loads(raw_data)
+        self.images_folder = data["images_folder"]
+        self.data = data["patterns"]
 
-    def create_patterns(self) -> List[MetaPattern]:
-        """Creates patterns and rules from JSON data"""
+    def create_patterns(self, compiled_path: str | None = None) -> List[MetaPattern]:
+        """
+        Creates patterns and rules from JSON data.
+        If compiled_path is given, a compiled tileset made from the same JSON is
+        loaded from there instead, and a fresh one is written there otherwise.
+        """
+        if compiled_path and os.path.exists(compiled_path):
+            tileset = CompiledTileset.load(compiled_path)
+            if tileset is not None and tileset.source_hash == self.source_hash:
+                meta_patterns = tileset.to_patterns()
+                repository.register_patterns(meta_patterns)
+                logger.info(f"Loaded compiled tileset {compiled_path}")
+                return meta_patterns
+
+        meta_patterns = self._create_patterns()
+        if compiled_path:
+            self.compile(compiled_path, meta_patterns)
+        return meta_patterns
+
+    def compile(
+        self, compiled_path: str, patterns: List[MetaPattern] | None = None
+    ) -> CompiledTileset:
+        """Write the resolved tileset to a binary file keyed by the JSON hash."""
+        if patterns is None:
+            patterns = self._create_patterns()
+        tileset = CompiledTileset.from_patterns(patterns, self.source_hash)
+        tileset.save(compiled_path)
+        return tileset
+
+    def _create_patterns(self) -> List[MetaPattern]:
         patterns_data = {p["id"]: p for p in self.data}
         meta_patterns = [
             MetaPattern(
                 uid=pattern_data["id"],
                 name=pattern_data["name"],
-                is_walkable=pattern_data["is_walkable"],
+                is_walkable=pattern_data.get("is_walkable", 1),
                 tags=set(pattern_data["tags"]),
                 weight=pattern_data["weight"],
                 patterns=tuple(
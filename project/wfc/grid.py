@@ -1,13 +1,24 @@
+import heapq
 import uuid
+from collections import OrderedDict
 from dataclasses import dataclass
+from enum import Enum, auto
 from typing import List, Optional, Tuple
 
 import numpy as np
 
 from project.config import HIDDEN_CELL
-from project.wfc.direction import Direction
+from project.wfc.direction import (
+    Direction,
+    direction_indices,
+    direction_offsets,
+    reverse_directions,
+)
 from project.wfc.pattern import MetaPattern
 from project.wfc.repository import Repository
+from project.wfc.rules import CompiledRuleSet
+
+EMPTY_CELL = -1
 
 
 @dataclass
@@ -34,24 +45,370 @@ class Rect:
         return self.width // 2, self.height // 2
 
 
+class Propagation(Enum):
+    """How far the consequences of a placement are propagated."""
+
+    NEIGHBORS = auto()
+    FULL = auto()
+
+
+class EntropyHeuristic(Enum):
+    """How the next cell to collapse is chosen."""
+
+    COUNT = auto()
+    SHANNON = auto()
+
+
 class Grid:
     def __init__(
-        self, patterns: List[MetaPattern], rect: Rect = Rect(width=3, height=3)
+        self,
+        patterns: List[MetaPattern],
+        rect: Rect = Rect(width=3, height=3),
+        propagation: Propagation = Propagation.NEIGHBORS,
+        heuristic: EntropyHeuristic = EntropyHeuristic.COUNT,
     ):
         self.width = rect.width
         self.height = rect.height
         self.patterns = patterns
+        self.propagation = propagation
+        self.heuristic = heuristic
+        self.rules = CompiledRuleSet.from_patterns(patterns)
+        self.constraints: np.ndarray | None = None
+        # a Template whose propagated starting state is cached per template key
+        self.template = None
+        self.record_trail = False
+        self._compatibility = self.rules.compatibility.astype(np.int32)
+        self._index_dtype = np.int16 if len(self.rules) < 2**15 else np.int32
+        # dense index -> pattern, the last entry maps EMPTY_CELL to None
+        self._pattern_table = np.array([*self.rules.patterns, None], dtype=object)
+        self._uid_table = self.get_property_table()
+        self._padding = 0
+        self._padded = None
+        self._state_key = None
+        self._weights = np.array([p.weight for p in self.rules.patterns], dtype=float)
+        self._weight_log_weights = self._weights * np.log(
+            np.where(self._weights > 0, self._weights, 1.0)
+        )
+        # (dx, dy, index of the reverse direction) in direction index order
+        self._offsets = [
+            (
+                *direction_offsets[direction],
+                direction_indices[reverse_directions[direction]],
+            )
+            for direction in Direction
+        ]
         self.initialize()
 
-    def initialize(self) -> None:
-        """Initialize or reset the grid with full entropy in all cells."""
-        self.grid = np.full((self.height, self.width), None)
-        self.entropy = np.full((self.height, self.width), len(self.patterns))
+    def initialize(self) -> Point | None:
+        """
+        Initialize or reset the grid with full entropy in all cells.
+        Patterns outside the constraints mask (height, width, patterns), if set,
+        are removed. Returns the first cell left without options, if any.
+        Buffers are reused while the size and the modes stay the same.
+        With a template, its propagated starting state is built on first use and
+        restored afterwards; an infeasible template raises InfeasibleTemplateError.
+        A template of another size than the grid raises ValueError.
+        """
+        if self.template is not None and (
+            self.template.rect.height,
+            self.template.rect.width,
+        ) != (self.height, self.width):
+            raise ValueError(
+                f"A {self.template.rect.width}x{self.template.rect.height} template "
+                f"does not fit a {self.width}x{self.height} grid."
+            )
+        if self._padded is None or self._indices.shape != (self.height, self.width):
+            self._allocate(self.height, self.width, self._padding)
+        key = (self.height, self.width, self.heuristic, self.propagation)
+        if key != self._state_key:
+            self._allocate_state()
+            self._state_key = key
+
+        # extra constraints change the starting state, so it is cached only without
+        cache_template = self.template is not None and self.constraints is None
+        if cache_template and self.template.key in self._template_states:
+            self._restore_start(self.template.key)
+            return None
+
+        self._indices.fill(EMPTY_CELL)
+        self.entropy.fill(len(self.rules))
+        self.wave.fill(True)
+        self._priority.fill(self._initial_priority)
+        self._entropy_heap = self._initial_heap.copy()
+        if self.heuristic == EntropyHeuristic.SHANNON:
+            self._sum_weights.fill(self._weights.sum())
+            self._sum_weight_log_weights.fill(self._weight_log_weights.sum())
+        self._queue = []
+        self._trail = []
+        if self.propagation == Propagation.FULL:
+            np.copyto(self.support, self._initial_support)
+            self._queue.extend(self._initial_unsupported)
+        constraints = self.constraints
+        if self.template is not None:
+            wave = self.template.get_wave(self.rules)
+            constraints = wave if constraints is None else constraints & wave
+        if constraints is not None:
+            for x, y in np.argwhere(~constraints.all(axis=2)).tolist():
+                self._queue.append((x, y, ~constraints[x, y]))
+        contradiction = self.propagate()
+        # the initial state is the bottom of the undo trail
+        self._trail = []
+        if cache_template:
+            self._save_start(self.template.key)
+        return contradiction
+
+    def _save_start(self, key: tuple, cache_size: int = 8) -> None:
+        """Keep a copy of the current, unplaced state as the start of a template."""
+        state = {
+            "wave": self.wave.copy(),
+            "entropy": self.entropy.copy(),
+            "priority": self._priority.copy(),
+            "heap": list(self._entropy_heap),
+        }
+        if self.propagation == Propagation.FULL:
+            state["support"] = self.support.copy()
+        if self.heuristic == EntropyHeuristic.SHANNON:
+            state["sum_weights"] = self._sum_weights.copy()
+            state["sum_weight_log_weights"] = self._sum_weight_log_weights.copy()
+        self._template_states[key] = state
+        while len(self._template_states) > cache_size:
+            self._template_states.popitem(last=False)
+
+    def _restore_start(self, key: tuple) -> None:
+        self._template_states.move_to_end(key)
+        state = self._template_states[key]
+        self._indices.fill(EMPTY_CELL)
+        np.copyto(self.wave, state["wave"])
+        np.copyto(self.entropy, state["entropy"])
+        np.copyto(self._priority, state["priority"])
+        self._entropy_heap = list(state["heap"])
+        if self.propagation == Propagation.FULL:
+            np.copyto(self.support, state["support"])
+        if self.heuristic == EntropyHeuristic.SHANNON:
+            np.copyto(self._sum_weights, state["sum_weights"])
+            np.copyto(self._sum_weight_log_weights, state["sum_weight_log_weights"])
+        self._queue = []
+        self._trail = []
+
+    def _allocate_state(self) -> None:
+        """Allocate the per-cell buffers and build the state they are reset to."""
+        shape = (self.height, self.width)
+        self.entropy = np.empty(shape, dtype=np.int64)
+        self.wave = np.empty((*shape, len(self.rules)), dtype=bool)
+        self._priority = np.empty(shape)
+        self._template_states = OrderedDict()
+        if self.heuristic == EntropyHeuristic.SHANNON:
+            self._sum_weights = np.empty(shape)
+            self._sum_weight_log_weights = np.empty(shape)
+            self._initial_priority = self._shannon_entropy(
+                self._weights.sum(), self._weight_log_weights.sum()
+            )
+        else:
+            self._initial_priority = len(self.rules)
+        self._initialize_entropy_index()
+        if self.propagation == Propagation.FULL:
+            self._initialize_support()
+
+    def _initialize_support(self) -> None:
+        """
+        Count, for every cell, direction and pattern, how many patterns of the
+        neighbor in that direction allow it. Patterns without support are queued
+        for removal on every initialization.
+        """
+        self.support = np.empty(
+            (self.height, self.width, len(Direction), len(self.rules)), dtype=np.int32
+        )
+        self._initial_support = np.empty_like(self.support)
+        for d, (dx, dy, r) in enumerate(self._offsets):
+            self._initial_support[:, :, d] = self._compatibility[r].sum(axis=0)
+            # border cells have no neighbor here, so nothing can take support away
+            if dx:
+                self._initial_support[0 if dx < 0 else -1, :, d] = 1
+            if dy:
+                self._initial_support[:, 0 if dy < 0 else -1, d] = 1
+
+        unsupported = np.any(self._initial_support == 0, axis=2)
+        self._initial_unsupported = [
+            (x, y, unsupported[x, y])
+            for x, y in np.argwhere(unsupported.any(axis=2)).tolist()
+        ]
+
+    def _initialize_entropy_index(self) -> None:
+        """
+        Build the initial heap of (priority, squared distance to center, x, y).
+        Entries are never updated in place: a changed priority pushes a new entry,
+        and entries that no longer match the grid are dropped when they surface,
+        which also covers cells left without options, e.g. when there are no rules.
+        """
+        xs, ys = np.indices((self.height, self.width))
+        self._center_distance = (xs - self.height // 2) ** 2 + (
+            ys - self.width // 2
+        ) ** 2
+        priority = self._initial_priority
+        if self.heuristic == EntropyHeuristic.COUNT:
+            priority = int(priority)
+        self._initial_heap = sorted(
+            (priority, int(self._center_distance[x, y]), x, y)
+            for x in range(self.height)
+            for y in range(self.width)
+        )
+
+    def _heap_key(self, x: int, y: int) -> int | float:
+        if self.heuristic == EntropyHeuristic.COUNT:
+            return int(self._priority[x, y])
+        return float(self._priority[x, y])
+
+    @staticmethod
+    def _shannon_entropy(sum_weights: float, sum_weight_log_weights: float) -> float:
+        """Weighted Shannon entropy of a set of options from sum(w) and sum(w log w)."""
+        if sum_weights <= 0:
+            return 0.0
+        entropy = np.log(sum_weights) - sum_weight_log_weights / sum_weights
+        return max(float(entropy), 0.0)
+
+    def set_entropy(self, p: Point, entropy: int) -> None:
+        """
+        Set the entropy of a cell, keeping the lowest-entropy index in sync.
+        The value is used as the cell priority as is, whatever the heuristic.
+        """
+        self.entropy[p.x, p.y] = entropy
+        self._priority[p.x, p.y] = entropy
+        self._push_entropy(p.x, p.y)
+
+    def _update_entropy(self, x: int, y: int) -> None:
+        """Reprioritize an empty cell after its options changed."""
+        if self.heuristic == EntropyHeuristic.COUNT:
+            self._priority[x, y] = self.entropy[x, y]
+        else:
+            self._priority[x, y] = self._shannon_entropy(
+                self._sum_weights[x, y], self._sum_weight_log_weights[x, y]
+            )
+        self._push_entropy(x, y)
+
+    def _push_entropy(self, x: int, y: int) -> None:
+        if self.entropy[x, y] > 0:
+            heapq.heappush(
+                self._entropy_heap,
+                (self._heap_key(x, y), int(self._center_distance[x, y]), x, y),
+            )
+
+    def _allocate(self, height: int, width: int, padding: int) -> None:
+        """
+        Allocate the cells inside a border of padding empty cells, so windows
+        around any cell are views of one persistent buffer.
+        """
+        self._padded = np.full(
+            (height + 2 * padding, width + 2 * padding),
+            EMPTY_CELL,
+            dtype=self._index_dtype,
+        )
+        self._indices = self._padded[
+            padding : padding + height, padding : padding + width
+        ]
+        self._padding = padding
+
+    @property
+    def indices(self) -> np.ndarray:
+        """Dense pattern indices of the cells, EMPTY_CELL for empty cells."""
+        return self._indices
+
+    @indices.setter
+    def indices(self, indices: np.ndarray) -> None:
+        if self._padded is None or self._indices.shape != indices.shape:
+            self._allocate(*indices.shape, self._padding)
+        self._indices[:] = indices
+
+    def _ensure_padding(self, view: Rect) -> None:
+        cx, cy = view.center
+        if max(cx, cy) > self._padding:
+            indices = self._indices
+            self._allocate(*indices.shape, max(cx, cy))
+            self._indices[:] = indices
+
+    def get_window(self, p: Point, view: Rect) -> np.ndarray:
+        """
+        Read-only view of the dense indices in a view around the cell (x, y),
+        EMPTY_CELL outside the grid. It follows later changes of the grid until
+        the buffer is reallocated for a new size or a larger view, call again
+        after either to get a fresh view.
+        """
+        self._ensure_padding(view)
+        cx, cy = view.center
+        x, y = p.x + self._padding - cy, p.y + self._padding - cx
+        window = self._padded[x : x + view.height, y : y + view.width]
+        window.flags.writeable = False
+        return window
+
+    def get_windows(self, view: Rect) -> np.ndarray:
+        """
+        Read-only (height, width, *view) views of the windows of all cells,
+        valid until the buffer is reallocated like those of get_window.
+        """
+        self._ensure_padding(view)
+        cx, cy = view.center
+        x, y = self._padding - cy, self._padding - cx
+        padded = self._padded[
+            x : x + self.height + view.height - 1, y : y + self.width + view.width - 1
+        ]
+        return np.lib.stride_tricks.sliding_window_view(
+            padded, (view.height, view.width)
+        )
+
+    def observe(self, p: Point, view: Rect) -> np.ndarray:
+        """Uids in a view around the cell (x, y), HIDDEN_CELL for empty cells."""
+        return self._uid_table[self.get_window(p, view)]
+
+    def observe_all(self, view: Rect) -> np.ndarray:
+        """Uids in the windows of all cells at once, (height, width, *view)."""
+        return self._uid_table[self.get_windows(view)]
+
+    @property
+    def grid(self) -> np.ndarray:
+        """
+        Patterns of the cells as an object array, None for empty cells.
+        The array is gathered from the indices and read-only, so writing to it
+        raises; change cells with place_pattern or by assigning a whole grid.
+        """
+        patterns = self._pattern_table[self.indices]
+        patterns.flags.writeable = False
+        return patterns
+
+    @grid.setter
+    def grid(self, patterns: np.ndarray) -> None:
+        self.indices = np.array(
+            [
+                [
+                    self.rules.get_index(pattern) if pattern else EMPTY_CELL
+                    for pattern in row
+                ]
+                for row in patterns
+            ],
+            dtype=self._index_dtype,
+        ).reshape(np.shape(patterns))
+
+    def get_pattern(self, p: Point) -> MetaPattern | None:
+        """Pattern placed at the cell (x, y), None if it is empty."""
+        return self._pattern_table[self.indices[p.x, p.y]]
+
+    def get_property_table(
+        self, property_func: callable = lambda pattern: pattern.uid
+    ) -> np.ndarray:
+        """Property of every pattern by dense index, the last entry is HIDDEN_CELL."""
+        return np.array(
+            [property_func(pattern) for pattern in self.rules.patterns] + [HIDDEN_CELL]
+        )
+
+    def get_properties(
+        self, property_func: callable = lambda pattern: pattern.uid
+    ) -> np.ndarray:
+        """Property of the pattern of every cell, HIDDEN_CELL for empty cells."""
+        return self.get_property_table(property_func)[self.indices]
 
     def iterate_cells(self):
+        patterns = self.grid
         for x in range(self.height):
             for y in range(self.width):
-                yield x, y, self.grid[x, y]
+                yield x, y, patterns[x, y]
 
     @staticmethod
     def get_patterns_property(
@@ -72,34 +429,21 @@ class Grid:
         cx, cy = view.center
 
         if is_extended:
-            proxy_grid = np.full(
-                (self.height + 2 * cy, self.width + 2 * cx),
-                None,
-                dtype=object,
-            )
-            proxy_grid[
-                cy : cy + self.height,
-                cx : cx + self.width,
-            ] = self.grid
-            x_max, y_max = p.x + view.height, p.y + view.width
-            return proxy_grid[p.x : x_max, p.y : y_max]
+            return self._pattern_table[self.get_window(p, view)]
 
         x_min, x_max = max(0, p.x - cy), min(self.height, p.x + cy + 1)
         y_min, y_max = max(0, p.y - cx), min(self.width, p.y + cx + 1)
-        return self.grid[y_min:y_max, x_min:x_max]
+        return self._pattern_table[self.indices[y_min:y_max, x_min:x_max]]
 
     def find_least_entropy_cell(self) -> Point | None:
         """Find the cell with the lowest entropy. If multiple, choose closest to center."""
-        candidates = self.entropy[self.entropy > 0]
-        if len(candidates) == 0:
-            return None
-        min_entropy = np.min(candidates)
-        candidates = np.argwhere(self.entropy == min_entropy)
-        center = np.array([self.height // 2, self.width // 2])
-        distances = np.linalg.norm(candidates - center, axis=1)
-        closest_index = np.argmin(distances)
-        candidate_y, candidate_x = candidates[closest_index]
-        return Point(x=candidate_y, y=candidate_x)
+        heap = self._entropy_heap
+        while heap:
+            priority, _, x, y = heap[0]
+            if self.entropy[x, y] > 0 and self._priority[x, y] == priority:
+                return Point(x=x, y=y)
+            heapq.heappop(heap)
+        return None
 
     def get_neighbors(self, p: Point) -> List[MetaPattern]:
         """Get neighbors and their directions for the cell (x, y)."""
@@ -116,40 +460,133 @@ class Grid:
 
     def get_valid_patterns(self, p: Point) -> List[MetaPattern]:
         """Get all valid patterns for the cell (x, y) based on neighbors' constraints."""
-        possible_patterns = set(self.patterns)
-
-        for nx, ny, direction in self.get_neighbors(p):
-            neighbor_pattern = self.grid[nx, ny]
-            if neighbor_pattern is not None:
-                allowed_patterns = neighbor_pattern.rules.get_allowed_neighbors(
-                    direction
-                )
-                possible_patterns = possible_patterns.intersection(allowed_patterns)
-
-        possible_patterns = list(possible_patterns)
-        possible_patterns = sorted(possible_patterns, key=lambda x: x.uid)
-        return possible_patterns
+        return self.rules.get_patterns(self.wave[p.x, p.y])
 
     def place_pattern(self, p: Point, pattern: MetaPattern) -> None:
         """Place a pattern in the grid at the specified position."""
-        self.grid[p.x, p.y] = pattern
-        self.entropy[p.x, p.y] = 0
+        self.indices[p.x, p.y] = self.rules.get_index(pattern)
+        self.set_entropy(p, 0)
+        if self.record_trail:
+            self._trail.append((p.x, p.y, None))
+        banned = np.ones(len(self.rules), dtype=bool)
+        banned[self.rules.get_index(pattern)] = False
+        self._ban(p.x, p.y, banned)
+
+    def _ban(self, x: int, y: int, mask: np.ndarray) -> None:
+        """
+        Remove the masked patterns from the wave of the cell (x, y).
+        With full propagation the neighbors' support counters are updated as well,
+        and patterns that lost their last support are queued for removal.
+        """
+        mask = mask & self.wave[x, y]
+        if not mask.any():
+            return
+        self.wave[x, y] &= ~mask
+        if self.heuristic == EntropyHeuristic.SHANNON:
+            self._sum_weights[x, y] -= mask @ self._weights
+            self._sum_weight_log_weights[x, y] -= mask @ self._weight_log_weights
+        if self.indices[x, y] == EMPTY_CELL:
+            self.entropy[x, y] -= mask.sum()
+            self._update_entropy(x, y)
+        if self.record_trail:
+            self._trail.append((x, y, mask))
+
+        if self.propagation != Propagation.FULL:
+            return
+        lost = mask @ self._compatibility
+        for d, (dx, dy, r) in enumerate(self._offsets):
+            nx, ny = x + dx, y + dy
+            if not (0 <= nx < self.height and 0 <= ny < self.width):
+                continue
+            support = self.support[nx, ny, r]
+            support -= lost[d]
+            unsupported = (lost[d] > 0) & (support == 0) & self.wave[nx, ny]
+            if unsupported.any():
+                self._queue.append((nx, ny, unsupported))
+
+    def _unban(self, x: int, y: int, mask: np.ndarray) -> None:
+        """Return the masked patterns to the wave of the cell (x, y), undoing _ban."""
+        self.wave[x, y] |= mask
+        if self.heuristic == EntropyHeuristic.SHANNON:
+            self._sum_weights[x, y] += mask @ self._weights
+            self._sum_weight_log_weights[x, y] += mask @ self._weight_log_weights
+        if self.indices[x, y] == EMPTY_CELL:
+            self.entropy[x, y] += mask.sum()
+            self._update_entropy(x, y)
+
+        if self.propagation != Propagation.FULL:
+            return
+        gained = mask @ self._compatibility
+        for d, (dx, dy, r) in enumerate(self._offsets):
+            nx, ny = x + dx, y + dy
+            if 0 <= nx < self.height and 0 <= ny < self.width:
+                self.support[nx, ny, r] += gained[d]
+
+    def trail_mark(self) -> int:
+        """Position in the undo trail to come back to with undo."""
+        return len(self._trail)
+
+    def undo(self, mark: int) -> None:
+        """Revert placements and removals recorded after the mark."""
+        self._queue.clear()
+        while len(self._trail) > mark:
+            x, y, mask = self._trail.pop()
+            if mask is None:
+                # placed cells count no options, count the wave once it is restored
+                self.indices[x, y] = EMPTY_CELL
+                self.entropy[x, y] = np.count_nonzero(self.wave[x, y])
+                self._update_entropy(x, y)
+            else:
+                self._unban(x, y, mask)
+
+    def exclude_pattern(self, p: Point, pattern: MetaPattern) -> Point | None:
+        """
+        Remove a pattern from the options of an empty cell.
+        Returns the first cell left without options, if any.
+        """
+        banned = np.zeros(len(self.rules), dtype=bool)
+        banned[self.rules.get_index(pattern)] = True
+        self._ban(p.x, p.y, banned)
+        if self.propagation == Propagation.FULL:
+            contradiction = self.propagate()
+            if contradiction is not None:
+                return contradiction
+        return None if self.wave[p.x, p.y].any() else p
+
+    def propagate(self) -> Point | None:
+        """
+        Remove queued patterns and everything that loses support because of them,
+        until a fixpoint. Returns the first cell left without options, if any.
+        """
+        while self._queue:
+            x, y, mask = self._queue.pop()
+            self._ban(x, y, mask)
+            if not self.wave[x, y].any():
+                self._queue.clear()
+                return Point(x=x, y=y)
+        return None
 
     def update_neighbors_entropy(self, p: Point) -> Point | None:
-        """Recalculate the entropy of neighboring cells after placing a pattern."""
-        for x, y, _ in self.get_neighbors(p):
-            np = Point(x=x, y=y)
-            if self.grid[np.x, np.y] is None:
-                possible_patterns = self.get_valid_patterns(np)
-                entropy = len(possible_patterns)
-                self.entropy[np.x, np.y] = len(possible_patterns)
-                if entropy == 0:
-                    return np
+        """Narrow the waves of neighboring cells after placing a pattern."""
+        if self.propagation == Propagation.FULL:
+            return self.propagate()
+
+        index = self.indices[p.x, p.y]
+        for x, y, direction in self.get_neighbors(p):
+            if self.indices[x, y] == EMPTY_CELL:
+                allowed = self.rules.get_allowed(reverse_directions[direction], index)
+                self._ban(x, y, ~allowed)
+                if self.entropy[x, y] == 0:
+                    return Point(x=x, y=y)
         return None
 
+    def get_indices(self) -> np.ndarray:
+        """Dense pattern indices of the grid, EMPTY_CELL for empty cells."""
+        return self.indices.copy()
+
     def is_collapsed(self) -> bool:
         """Check if the entire grid has been filled."""
-        return np.all(self.grid != None)
+        return bool(np.all(self.indices != EMPTY_CELL))
 
     def serialize(
         self,
@@ -164,10 +601,12 @@ class Grid:
         if name is None:
             name = str(uuid.uuid4())
 
-        properties = self.get_patterns_property(
-            property_func=property_func, patterns=self.grid
-        )
+        properties = self.get_properties(property_func=property_func)
+        self.save_properties(properties=properties, path=path, name=name)
 
+    @staticmethod
+    def save_properties(properties: np.ndarray, path: str, name: str) -> None:
+        """Write a 2D array of pattern properties in the .dat format."""
         with open(f"{path}{name}.dat", "w") as f:
             for row in properties:
                 f.write(",".join(map(str, row)) + "\n")
@@ -177,21 +616,28 @@ class Grid:
         Deserialize a file to reconstruct the grid.
         NB: works by uid.
         """
-        grid = []
         with open(path, "r") as f:
-            for line in f:
-                row = [
-                    repository.get_pattern_by_uid(int(value)) if value != -1 else None
-                    for value in line.strip().split(",")
-                ]
-                grid.append(row)
-        self.grid = np.array(grid)
-        self.height = len(grid)
-        self.width = len(grid[0])
+            uids = np.array(
+                [[int(value) for value in line.strip().split(",")] for line in f]
+            )
+        # resolve every distinct uid once, then gather
+        unique_uids, inverse = np.unique(uids, return_inverse=True)
+        table = np.array(
+            [
+                (
+                    self.rules.get_index(repository.get_pattern_by_uid(int(uid)))
+                    if uid != HIDDEN_CELL
+                    else EMPTY_CELL
+                )
+                for uid in unique_uids
+            ],
+            dtype=self._index_dtype,
+        )
+        self.height, self.width = uids.shape
+        self.indices = table[inverse].reshape(uids.shape)
 
     def __str__(self) -> str:
         """Custom string representation of the grid showing uids or 'None'."""
         return "\n".join(
-            " | ".join(f"{cell.uid:03}" if cell else "-01" for cell in row)
-            for row in self.grid
+            " | ".join(f"{uid:03}" for uid in row) for row in self.get_properties()
         )
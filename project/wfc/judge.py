@@ -3,15 +3,27 @@ from typing import List
 
 import numpy as np
 
-from project.utils.utils import Utils
+from project.utils.sampling import Sampler
 from project.wfc.grid import Rect
 from project.wfc.wobj import WeightedObject
 
 
 class Judge(ABC):
     def __init__(self, seed: int | None = None, view: Rect = Rect(1, 1)):
-        self.seed = seed
         self.view = view
+        self.sampler = Sampler(seed)
+
+    @property
+    def seed(self) -> int | None:
+        return self.sampler.seed
+
+    @property
+    def random(self) -> np.random.Generator:
+        return self.sampler.random
+
+    def reseed(self, seed: int | None) -> None:
+        """Restart the judge's random stream from a new seed."""
+        self.sampler.reseed(seed)
 
     @abstractmethod
     def select(
@@ -27,7 +39,7 @@ class RandomJudge(Judge):
     def select(
         self, objects: List[WeightedObject], state: np.ndarray
     ) -> WeightedObject:
-        return Utils.weighted_choice(objects=objects, seed=self.seed)
+        return self.sampler.choice(objects)
 
 
 class GreedyJudge(Judge):
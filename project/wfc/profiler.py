@@ -0,0 +1,88 @@
+import json
+import time
+from collections import defaultdict
+from enum import Enum
+from typing import Dict
+
+
+class Phase(Enum):
+    FIND_CELL = "find_cell"
+    VALID_PATTERNS = "valid_patterns"
+    OBSERVE = "observe"
+    SELECT = "select"
+    PROPAGATE = "propagate"
+    UNDO = "undo"
+
+
+class Profiler:
+    """
+    Accumulates wall time and calls per phase of WFC steps and counts step
+    outcomes. Phases are timed with laps: start() once, then lap() at the end
+    of every phase, which also starts the next one.
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.times: Dict[Phase, float] = defaultdict(float)
+        self.calls: Dict[Phase, int] = defaultdict(int)
+        self.outcomes: Dict[str, int] = defaultdict(int)
+
+    @staticmethod
+    def start() -> float:
+        return time.perf_counter()
+
+    def lap(self, phase: Phase, start: float) -> float:
+        """Add the time since start to the phase, return the current time."""
+        now = time.perf_counter()
+        self.times[phase] += now - start
+        self.calls[phase] += 1
+        return now
+
+    def count(self, outcome: str) -> None:
+        self.outcomes[outcome] += 1
+
+    def merge(self, other: "Profiler") -> None:
+        """Add the measurements of another profiler, e.g. of a pool worker."""
+        for phase, elapsed in other.times.items():
+            self.times[phase] += elapsed
+        for phase, calls in other.calls.items():
+            self.calls[phase] += calls
+        for outcome, count in other.outcomes.items():
+            self.outcomes[outcome] += count
+
+    def summary(self) -> dict:
+        """Plain dict of the measurements, ready for JSON."""
+        return {
+            "total_time": sum(self.times.values()),
+            "phases": {
+                phase.value: {
+                    "time": self.times[phase],
+                    "calls": self.calls[phase],
+                    "mean": self.times[phase] / self.calls[phase],
+                }
+                for phase in Phase
+                if self.calls[phase] > 0
+            },
+            "outcomes": dict(self.outcomes),
+        }
+
+    def to_json(self, path: str | None = None) -> str:
+        """Serialize the summary, writing it to path if given."""
+        summary = json.dumps(self.summary(), indent=2)
+        if path:
+            with open(path, "w") as f:
+                f.write(summary)
+        return summary
+
+    def __str__(self) -> str:
+        summary = self.summary()
+        lines = [f"Total: {summary['total_time']:.4f}s"]
+        for name, phase in summary["phases"].items():
+            lines.append(
+                f"{name}: {phase['time']:.4f}s in {phase['calls']} calls, "
+                f"{phase['mean'] * 1e6:.1f}us per call"
+            )
+        lines.append(f"Outcomes: {summary['outcomes']}")
+        return "\n".join(lines)
@@ -1,10 +1,14 @@
+from collections import defaultdict
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import List, Union
+from typing import Dict, List, Tuple, Union
+
+import numpy as np
 
 from project.logger import logger
-from project.wfc.direction import Direction, reverse_directions
+from project.wfc.direction import Direction, direction_indices, reverse_directions
 from project.wfc.pattern import MetaPattern
+from project.wfc.rules import CompiledRuleSet
 from project.wfc.special_rules import SpecialRule
 
 
@@ -20,15 +24,34 @@ class ValidationError:
     direction: Direction
 
 
+@dataclass
+class ValidationFix:
+    """Suggestion to allow neighbour_uid in a direction of pattern_uid."""
+
+    pattern_uid: int
+    neighbour_uid: int
+    direction: Direction
+
+
 @dataclass
 class ValidationMessage:
     result: ValidationResult = ValidationResult.SUCCESS
     error: Union[ValidationError, None] = field(default_factory=list)
+    unreachable: List[int] = field(default_factory=list)
+    empty_directions: List[Tuple[int, Direction]] = field(default_factory=list)
+    fixes: List[ValidationFix] = field(default_factory=list)
 
     def __str__(self):
-        error_str = "\n".join(str(err) for err in self.error)
-        error_str = f"Errors {len(self.error)}:\n{error_str}"
-        return f"Validation Result: {self.result.value}\n{error_str if len(self.error) > 0 else ''}"
+        lines = [f"Validation Result: {self.result.value}"]
+        if len(self.error) > 0:
+            lines.append(f"Errors {len(self.error)}:")
+            lines.extend(str(err) for err in self.error)
+        if self.unreachable:
+            lines.append(f"Unreachable patterns: {self.unreachable}")
+        if self.empty_directions:
+            empty = [(uid, direction.name) for uid, direction in self.empty_directions]
+            lines.append(f"Patterns without neighbours: {empty}")
+        return "\n".join(lines)
 
     def __repr__(self):
         return self.__str__()
@@ -37,28 +60,68 @@ class ValidationMessage:
 class Repository:
     def __init__(self) -> None:
         self.patterns = None
+        self.uids = np.empty(0, dtype=np.int64)
+        self._patterns_by_uid: Dict[int, MetaPattern] = {}
+        self._patterns_by_tag: Dict[str, List[MetaPattern]] = {}
+        self._indices_by_uid: Dict[int, int] = {}
+        self._index_table = np.full(1, -1, dtype=np.int64)
 
     def register_patterns(self, patterns: List[MetaPattern]) -> None:
+        """
+        Register patterns and index them by uid and tag.
+        Every pattern also gets a dense index, its position in uid order.
+        """
         self.patterns = patterns
+        self._patterns_by_uid = {pattern.uid: pattern for pattern in patterns}
+        self._patterns_by_tag = defaultdict(list)
+        for pattern in patterns:
+            for tag in pattern.tags:
+                self._patterns_by_tag[tag].append(pattern)
+        self.uids = np.array(sorted(self._patterns_by_uid), dtype=np.int64)
+        self._indices_by_uid = {int(uid): i for i, uid in enumerate(self.uids)}
+        # uid -> dense index lookup table, its last entry maps HIDDEN_CELL to -1
+        self._index_table = np.full(int(self.uids.max(initial=0)) + 2, -1, np.int64)
+        self._index_table[self.uids] = np.arange(len(self.uids))
+
+    def validate_patterns(
+        self, rules: CompiledRuleSet | None = None
+    ) -> ValidationMessage:
+        """
+        Check the rules on their compatibility matrices: a pattern allowed in
+        a direction must allow the other one back. Also reports patterns no rule
+        leads to and patterns without any allowed neighbour in some direction,
+        and suggests adding the missing reverse rules.
+        """
+        if rules is None:
+            rules = CompiledRuleSet.from_patterns(self.patterns)
+        compatibility = rules.compatibility
+        uids = [pattern.uid for pattern in rules.patterns]
 
-    def validate_patterns(self) -> ValidationMessage:
         message = ValidationMessage()
-        for pattern in self.patterns:
-            for direction in Direction:
-                reverse_direction = reverse_directions[direction]
-                direction_neighbours = pattern.rules.get_allowed_neighbors(direction)
-                for neighbour in direction_neighbours:
-                    if pattern in neighbour.rules.get_allowed_neighbors(
-                        reverse_direction
-                    ):
-                        continue
-                    error = ValidationError(
-                        pattern_uid=pattern.uid,
-                        neighbour_uid=neighbour.uid,
-                        direction=direction,
+        for direction in Direction:
+            reverse_direction = reverse_directions[direction]
+            d = direction_indices[direction]
+            reverse = compatibility[direction_indices[reverse_direction]]
+            for i, j in np.argwhere(compatibility[d] & ~reverse.T).tolist():
+                message.error.append(
+                    ValidationError(
+                        pattern_uid=uids[i], neighbour_uid=uids[j], direction=direction
+                    )
+                )
+                message.fixes.append(
+                    ValidationFix(
+                        pattern_uid=uids[j],
+                        neighbour_uid=uids[i],
+                        direction=reverse_direction,
                     )
-                    message.error.append(error)
-                    message.result = ValidationResult.FAIL
+                )
+        if message.error:
+            message.result = ValidationResult.FAIL
+
+        reachable = compatibility.any(axis=(0, 1))
+        message.unreachable = [uids[i] for i in np.flatnonzero(~reachable).tolist()]
+        for d, i in np.argwhere(~compatibility.any(axis=2)).tolist():
+            message.empty_directions.append((uids[i], list(Direction)[d]))
         return message
 
     def get_all_patterns(self) -> List[MetaPattern]:
@@ -75,11 +138,7 @@ class Repository:
 
     def get_patterns_by_tag(self, tag: str) -> List[MetaPattern]:
         """Get patterns by a tag"""
-        result = []
-
-        for pattern in self.patterns:
-            if tag in pattern.tags:
-                result.append(pattern)
+        result = list(self._patterns_by_tag.get(tag, []))
 
         if len(result) == 0:
             logger.warning(f"Zero patterns with tag: {tag}")
@@ -94,14 +153,19 @@ class Repository:
 
     def get_pattern_by_uid(self, uid: int) -> MetaPattern | None:
         """Find one pattern with uid"""
-        result = None
+        return self._patterns_by_uid.get(uid)
 
-        for pattern in self.patterns:
-            if pattern.uid == uid:
-                result = pattern
-                break
+    def get_index_by_uid(self, uid: int) -> int | None:
+        """Dense index of the pattern with uid"""
+        return self._indices_by_uid.get(uid)
 
-        return result
+    def get_indices_by_uids(self, uids: np.ndarray) -> np.ndarray:
+        """Dense indices for an array of uids, -1 stays -1"""
+        return self._index_table[uids]
+
+    def get_pattern_by_index(self, index: int) -> MetaPattern:
+        """Find the pattern with a dense index"""
+        return self._patterns_by_uid[int(self.uids[index])]
 
 
 repository = Repository()
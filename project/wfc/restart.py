@@ -0,0 +1,141 @@
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import numpy as np
+
+from project.utils.sampling import derive_seed
+from project.wfc.grid import EMPTY_CELL
+from project.wfc.wfc import WFC, GenerationResult
+
+
+def luby(i: int) -> int:
+    """i-th term (from 1) of the Luby sequence 1, 1, 2, 1, 1, 2, 4, 1, ..."""
+    while True:
+        k = i.bit_length()
+        if i == (1 << k) - 1:
+            return 1 << (k - 1)
+        i -= (1 << (k - 1)) - 1
+
+
+class RestartPolicy(ABC):
+    """How long an attempt may run before the driver restarts from scratch."""
+
+    backtracking: bool = True
+
+    @abstractmethod
+    def budget(self, attempt: int) -> int | None:
+        """Step budget of the attempt (from 0), None for no budget."""
+        pass
+
+
+class ImmediateRestart(RestartPolicy):
+    """Restart at the first contradiction, without backtracking."""
+
+    backtracking = False
+
+    def budget(self, attempt: int) -> int | None:
+        return None
+
+
+class LubyRestart(RestartPolicy):
+    """Backtrack within unit * luby(attempt + 1) steps."""
+
+    def __init__(self, unit: int = 100) -> None:
+        self.unit = unit
+
+    def budget(self, attempt: int) -> int | None:
+        return self.unit * luby(attempt + 1)
+
+
+class GeometricRestart(RestartPolicy):
+    """Backtrack within initial * factor ** attempt steps."""
+
+    def __init__(self, initial: int = 100, factor: float = 1.5) -> None:
+        self.initial = initial
+        self.factor = factor
+
+    def budget(self, attempt: int) -> int | None:
+        return int(self.initial * self.factor**attempt)
+
+
+@dataclass
+class RestartStats:
+    """Summary of all attempts made for one grid."""
+
+    success: bool = False
+    attempts: int = 0
+    steps: int = 0
+    steps_wasted: int = 0
+    elapsed: float = 0.0
+    outcomes: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+    failure_positions: np.ndarray | None = None
+    failure_depths: List[int] = field(default_factory=list)
+
+
+class RestartDriver:
+    """
+    Own the restart loop of a WFC: run attempts under a restart policy until
+    one succeeds or max_attempts or max_time run out. The time cap is checked
+    between attempts, so with a bounded policy the worst case latency is
+    max_time plus one attempt.
+    """
+
+    def __init__(
+        self,
+        wfc: WFC,
+        policy: RestartPolicy | None = None,
+        max_attempts: int | None = 1000,
+        max_time: float | None = None,
+    ) -> None:
+        self.wfc = wfc
+        self.policy = policy or ImmediateRestart()
+        self.max_attempts = max_attempts
+        self.max_time = max_time
+
+    def _attempt(self, attempt: int, seed: int | None) -> GenerationResult:
+        if seed is not None:
+            self.wfc.judge.reseed(derive_seed(seed, attempt))
+        budget = self.policy.budget(attempt)
+        if self.policy.backtracking:
+            return self.wfc.generate_with_backtracking(
+                max_backtracks=None, max_steps=budget
+            )
+        return self.wfc.generate_attempt(max_steps=budget)
+
+    def generate(self, seed: int | None = None) -> RestartStats:
+        """
+        Generate one grid, leaving it in wfc.grid if the stats say success.
+        With a seed every attempt reseeds the judge from (seed, attempt), so the
+        whole sequence of attempts is reproducible.
+        """
+        grid = self.wfc.grid
+        stats = RestartStats(
+            failure_positions=np.zeros((grid.height, grid.width), dtype=np.int64)
+        )
+        start = time.perf_counter()
+        while self.max_attempts is None or stats.attempts < self.max_attempts:
+            if (
+                self.max_time is not None
+                and time.perf_counter() - start > self.max_time
+            ):
+                break
+            result = self._attempt(stats.attempts, seed)
+            stats.attempts += 1
+            stats.steps += result.steps
+            stats.outcomes[result.outcome.name] += 1
+            if result.success:
+                stats.success = True
+                break
+            stats.steps_wasted += result.steps
+            if result.failed_point is not None:
+                stats.failure_positions[
+                    result.failed_point.x, result.failed_point.y
+                ] += 1
+            stats.failure_depths.append(
+                int(np.count_nonzero(grid.indices != EMPTY_CELL))
+            )
+        stats.elapsed = time.perf_counter() - start
+        return stats
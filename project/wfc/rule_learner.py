@@ -0,0 +1,156 @@
+import hashlib
+import json
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+
+from project.logger import logger
+from project.wfc.corpus import Corpus
+from project.wfc.direction import Direction, direction_indices, direction_offsets
+from project.wfc.pattern import MetaPattern
+from project.wfc.rules import NeighborRuleSet
+from project.wfc.tileset import CompiledTileset
+
+
+@dataclass
+class LearnedRules:
+    """
+    Adjacencies observed in a corpus. counts[d, i, j] is how many times pattern
+    j was found in direction d from pattern i, occurrences[i] how many cells
+    hold pattern i. Patterns are indexed by their position in uids.
+    """
+
+    uids: np.ndarray
+    counts: np.ndarray
+    occurrences: np.ndarray
+
+    @classmethod
+    def from_grids(
+        cls, grids: np.ndarray, uids: np.ndarray, chunk_size: int = 4096
+    ) -> "LearnedRules":
+        """Count adjacencies in (count, height, width) dense indices, -1 is empty."""
+        size = len(uids)
+        counts = np.zeros((len(Direction), size, size), dtype=np.int64)
+        occurrences = np.zeros(size, dtype=np.int64)
+        _, height, width = grids.shape
+        for start in range(0, len(grids), chunk_size):
+            chunk = np.asarray(grids[start : start + chunk_size], dtype=np.int64)
+            occurrences += np.bincount(chunk[chunk >= 0], minlength=size)
+            for direction in (Direction.UP, Direction.LEFT):
+                dx, dy = direction_offsets[direction]
+                # cells that have a neighbor in the direction, and those neighbors
+                cells = chunk[
+                    :,
+                    max(0, -dx) : height - max(0, dx),
+                    max(0, -dy) : width - max(0, dy),
+                ]
+                neighbors = chunk[
+                    :,
+                    max(0, dx) : height - max(0, -dx),
+                    max(0, dy) : width - max(0, -dy),
+                ]
+                pairs = cells * size + neighbors
+                pairs = pairs[(cells >= 0) & (neighbors >= 0)]
+                counts[direction_indices[direction]] += np.bincount(
+                    pairs, minlength=size * size
+                ).reshape(size, size)
+        # every pair seen upwards is the same pair seen downwards the other way
+        counts[direction_indices[Direction.DOWN]] = counts[
+            direction_indices[Direction.UP]
+        ].T
+        counts[direction_indices[Direction.RIGHT]] = counts[
+            direction_indices[Direction.LEFT]
+        ].T
+        return cls(uids=np.asarray(uids), counts=counts, occurrences=occurrences)
+
+    @classmethod
+    def from_corpus(cls, corpus: Corpus, chunk_size: int = 4096) -> "LearnedRules":
+        return cls.from_grids(corpus.grids, corpus.uids, chunk_size=chunk_size)
+
+    def get_compatibility(self, min_count: int = 1) -> np.ndarray:
+        """(directions, P, P) mask of adjacencies seen at least min_count times."""
+        return self.counts >= min_count
+
+    def to_patterns(
+        self, patterns: List[MetaPattern], min_count: int = 1
+    ) -> List[MetaPattern]:
+        """
+        Copies of the observed patterns with learned rules, weighted by how often
+        they occur. Patterns that never occur in the corpus are left out.
+        """
+        by_uid = {pattern.uid: pattern for pattern in patterns}
+        compatibility = self.get_compatibility(min_count)
+        seen = np.flatnonzero(self.occurrences > 0)
+        if len(seen) < len(self.uids):
+            logger.info(f"{len(self.uids) - len(seen)} patterns never occur, skipped")
+
+        learned = []
+        for i in seen.tolist():
+            source = by_uid[int(self.uids[i])]
+            learned.append(
+                MetaPattern(
+                    uid=source.uid,
+                    name=source.name,
+                    is_walkable=source.is_walkable,
+                    tags=set(source.tags),
+                    weight=int(self.occurrences[i]),
+                    patterns=source.patterns,
+                )
+            )
+        # patterns that never occur have no adjacencies, only the seen ones matter
+        compatibility = compatibility[:, seen[:, None], seen]
+        for i, pattern in enumerate(learned):
+            pattern.rules = NeighborRuleSet.from_compatibility(
+                learned, compatibility, i
+            )
+        return learned
+
+    def to_tileset(
+        self, patterns: List[MetaPattern], min_count: int = 1
+    ) -> CompiledTileset:
+        """Compiled tileset of the learned patterns, hashed by the counts."""
+        source_hash = hashlib.sha256(self.counts.tobytes()).hexdigest()
+        return CompiledTileset.from_patterns(
+            self.to_patterns(patterns, min_count=min_count), source_hash
+        )
+
+    def save_json(
+        self,
+        path: str,
+        patterns: List[MetaPattern],
+        images_folder: str,
+        min_count: int = 1,
+    ) -> None:
+        """Write the learned patterns in the JSON format read by Factory."""
+        data = {
+            "images_folder": images_folder,
+            "patterns": [
+                {
+                    "id": pattern.uid,
+                    "name": pattern.name,
+                    "tags": sorted(pattern.tags),
+                    "is_walkable": pattern.is_walkable,
+                    "weight": pattern.weight,
+                    "rules": {
+                        direction.name.lower(): [
+                            neighbor.uid
+                            for neighbor in pattern.rules.get_allowed_neighbors(
+                                direction
+                            )
+                        ]
+                        for direction in Direction
+                    },
+                    "patterns": [
+                        {
+                            "image_path": image.image_path.removeprefix(images_folder),
+                            "weight": image.weight,
+                        }
+                        for image in pattern.patterns
+                    ],
+                }
+                for pattern in self.to_patterns(patterns, min_count=min_count)
+            ],
+        }
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
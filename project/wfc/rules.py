@@ -1,7 +1,9 @@
 from dataclasses import dataclass, field
-from typing import Dict, Set, Union
+from typing import Dict, List, Set, Union
 
-from project.wfc.direction import Direction
+import numpy as np
+
+from project.wfc.direction import Direction, direction_indices
 from project.wfc.pattern import MetaPattern
 
 
@@ -20,6 +22,27 @@ class NeighborRuleSet:
             Direction.LEFT: self.allowed_left,
         }
 
+    @classmethod
+    def from_compatibility(
+        cls, patterns: List[MetaPattern], compatibility: np.ndarray, i: int
+    ) -> "NeighborRuleSet":
+        """Rules of patterns[i] from a (directions, P, P) mask over the patterns."""
+        allowed = {
+            direction: [
+                patterns[j]
+                for j in np.flatnonzero(
+                    compatibility[direction_indices[direction], i]
+                ).tolist()
+            ]
+            for direction in Direction
+        }
+        return cls(
+            allowed_up=allowed[Direction.UP],
+            allowed_down=allowed[Direction.DOWN],
+            allowed_left=allowed[Direction.LEFT],
+            allowed_right=allowed[Direction.RIGHT],
+        )
+
     def get_allowed_neighbors(
         self, direction: Union[Direction, None] = None
     ) -> Union[Set[MetaPattern], Dict[Direction, Set[MetaPattern]]]:
@@ -27,3 +50,52 @@ class NeighborRuleSet:
         if direction is None:
             return self.allowed_neighbors.values()
         return self.allowed_neighbors.get(direction, set())
+
+
+@dataclass
+class CompiledRuleSet:
+    """
+    Dense form of the patterns' NeighborRuleSets.
+    Patterns are indexed by their position in uid order, and
+    compatibility[d, i, j] tells whether pattern j may be placed
+    in direction d from pattern i.
+    """
+
+    patterns: List[MetaPattern]
+    compatibility: np.ndarray
+
+    def __post_init__(self):
+        self.index_by_uid: Dict[int, int] = {
+            pattern.uid: i for i, pattern in enumerate(self.patterns)
+        }
+
+    @classmethod
+    def from_patterns(cls, patterns: List[MetaPattern]) -> "CompiledRuleSet":
+        """Compile the rules of the given patterns into compatibility matrices."""
+        patterns = sorted(patterns, key=lambda pattern: pattern.uid)
+        index_by_uid = {pattern.uid: i for i, pattern in enumerate(patterns)}
+        compatibility = np.zeros(
+            (len(Direction), len(patterns), len(patterns)), dtype=bool
+        )
+        for i, pattern in enumerate(patterns):
+            for direction in Direction:
+                d = direction_indices[direction]
+                for neighbor in pattern.rules.get_allowed_neighbors(direction):
+                    j = index_by_uid.get(neighbor.uid)
+                    if j is not None:
+                        compatibility[d, i, j] = True
+        return cls(patterns=patterns, compatibility=compatibility)
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def get_index(self, pattern: MetaPattern) -> int:
+        return self.index_by_uid[pattern.uid]
+
+    def get_allowed(self, direction: Direction, index: int) -> np.ndarray:
+        """Boolean mask of patterns allowed in a direction from the pattern at index."""
+        return self.compatibility[direction_indices[direction], index]
+
+    def get_patterns(self, mask: np.ndarray) -> List[MetaPattern]:
+        """Patterns selected by a boolean mask, in uid order."""
+        return [self.patterns[i] for i in np.flatnonzero(mask)]
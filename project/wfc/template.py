@@ -0,0 +1,130 @@
+from typing import Dict, Iterable, List, Set, Tuple
+
+import numpy as np
+
+from project.wfc.direction import (
+    Direction,
+    direction_indices,
+    direction_offsets,
+    reverse_directions,
+)
+from project.wfc.grid import Point, Rect
+from project.wfc.pattern import MetaPattern
+from project.wfc.rules import CompiledRuleSet
+
+
+class InfeasibleTemplateError(ValueError):
+    """The constraints of a template leave some cell without options."""
+
+    def __init__(self, point: Point) -> None:
+        super().__init__(
+            f"Template leaves cell ({point.x}, {point.y}) without options."
+        )
+        self.point = point
+
+
+def propagate_wave(wave: np.ndarray, compatibility: np.ndarray) -> np.ndarray:
+    """
+    Remove from a (height, width, patterns) wave every pattern that some
+    neighbor cannot support, until nothing changes.
+    """
+    compatibility = compatibility.astype(np.int32)
+    height, width, _ = wave.shape
+    while True:
+        supported = np.ones_like(wave)
+        for direction in Direction:
+            dx, dy = direction_offsets[direction]
+            r = direction_indices[reverse_directions[direction]]
+            cells = (
+                slice(max(0, -dx), height - max(0, dx)),
+                slice(max(0, -dy), width - max(0, dy)),
+            )
+            neighbors = (
+                slice(max(0, dx), height - max(0, -dx)),
+                slice(max(0, dy), width - max(0, -dy)),
+            )
+            supported[cells] &= (
+                wave[neighbors].astype(np.int32) @ compatibility[r]
+            ) > 0
+        narrowed = wave & supported
+        if np.array_equal(narrowed, wave):
+            return wave
+        wave = narrowed
+
+
+class Template:
+    """
+    Constraints on chosen cells of a grid: allowed patterns or tags.
+    Assigned to Grid.template, the constraints are propagated once and the
+    starting state is cached by the grid, so generations for the same
+    template start from it directly.
+    """
+
+    def __init__(self, rect: Rect) -> None:
+        self.rect = rect
+        self._uids: Dict[Tuple[int, int], frozenset] = {}
+        self._tags: Dict[Tuple[int, int], List[frozenset]] = {}
+
+    def _check(self, p: Point) -> None:
+        if not (0 <= p.x < self.rect.height and 0 <= p.y < self.rect.width):
+            raise ValueError(f"Cell ({p.x}, {p.y}) is outside the template.")
+
+    def restrict(self, p: Point, patterns: Iterable[MetaPattern]) -> "Template":
+        """Allow only the given patterns at the cell (x, y)."""
+        self._check(p)
+        uids = frozenset(pattern.uid for pattern in patterns)
+        cell = (p.x, p.y)
+        self._uids[cell] = self._uids.get(cell, uids) & uids
+        return self
+
+    def pin(self, p: Point, pattern: MetaPattern) -> "Template":
+        """Fix the pattern of the cell (x, y)."""
+        return self.restrict(p, [pattern])
+
+    def restrict_tags(self, p: Point, tags: Set[str]) -> "Template":
+        """Allow only patterns with at least one of the tags at the cell (x, y)."""
+        self._check(p)
+        self._tags.setdefault((p.x, p.y), []).append(frozenset(tags))
+        return self
+
+    def border(self) -> List[Point]:
+        """Cells on the edge of the template."""
+        return [
+            Point(x=x, y=y)
+            for x, y in self.rect.indices
+            if x in (0, self.rect.height - 1) or y in (0, self.rect.width - 1)
+        ]
+
+    @property
+    def key(self) -> tuple:
+        """Hashable description of the constraints, the same for equal templates."""
+        return (
+            self.rect.width,
+            self.rect.height,
+            tuple(sorted((cell, tuple(sorted(u))) for cell, u in self._uids.items())),
+            tuple(
+                sorted(
+                    (cell, tuple(sorted(tuple(sorted(t)) for t in tags)))
+                    for cell, tags in self._tags.items()
+                )
+            ),
+        )
+
+    def get_wave(self, rules: CompiledRuleSet) -> np.ndarray:
+        """
+        Starting (height, width, patterns) wave: the constraints propagated to
+        all cells. Raises InfeasibleTemplateError if a cell is left empty.
+        """
+        wave = np.ones((self.rect.height, self.rect.width, len(rules)), dtype=bool)
+        uids = np.array([pattern.uid for pattern in rules.patterns])
+        for (x, y), allowed in self._uids.items():
+            wave[x, y] &= np.isin(uids, list(allowed))
+        for (x, y), tag_sets in self._tags.items():
+            for tags in tag_sets:
+                wave[x, y] &= [bool(pattern.tags & tags) for pattern in rules.patterns]
+
+        wave = propagate_wave(wave, rules.compatibility)
+        empty = np.argwhere(~wave.any(axis=2))
+        if len(empty):
+            raise InfeasibleTemplateError(Point(x=int(empty[0][0]), y=int(empty[0][1])))
+        return wave
@@ -0,0 +1,101 @@
+from dataclasses import dataclass
+from typing import List
+
+import numpy as np
+
+from project.wfc.pattern import MetaPattern, Pattern
+from project.wfc.rules import CompiledRuleSet, NeighborRuleSet
+
+FORMAT_VERSION = 1
+
+
+@dataclass
+class CompiledTileset:
+    """
+    Resolved tileset in a form that loads without parsing or resolving rules.
+    Patterns are stored in uid order; images of pattern i are
+    image_paths[image_offsets[i]:image_offsets[i + 1]].
+    """
+
+    source_hash: str
+    uids: np.ndarray
+    names: np.ndarray
+    weights: np.ndarray
+    is_walkable: np.ndarray
+    tag_names: np.ndarray
+    tags: np.ndarray
+    image_paths: np.ndarray
+    image_weights: np.ndarray
+    image_offsets: np.ndarray
+    compatibility: np.ndarray
+
+    @classmethod
+    def from_patterns(
+        cls, patterns: List[MetaPattern], source_hash: str
+    ) -> "CompiledTileset":
+        rules = CompiledRuleSet.from_patterns(patterns)
+        patterns = rules.patterns
+        tag_names = sorted({tag for pattern in patterns for tag in pattern.tags})
+        images = [image for pattern in patterns for image in pattern.patterns]
+        return cls(
+            source_hash=source_hash,
+            uids=np.array([p.uid for p in patterns], dtype=np.int64),
+            names=np.array([p.name for p in patterns], dtype=str),
+            weights=np.array([p.weight for p in patterns]),
+            is_walkable=np.array([p.is_walkable for p in patterns], dtype=np.int64),
+            tag_names=np.array(tag_names, dtype=str),
+            tags=np.array(
+                [[tag in p.tags for tag in tag_names] for p in patterns], dtype=bool
+            ).reshape(len(patterns), len(tag_names)),
+            image_paths=np.array([image.image_path for image in images], dtype=str),
+            image_weights=np.array([image.weight for image in images]),
+            image_offsets=np.cumsum([0] + [len(p.patterns) for p in patterns]),
+            compatibility=rules.compatibility,
+        )
+
+    def save(self, path: str) -> None:
+        # write through a file object so numpy does not append .npz to the path
+        with open(path, "wb") as f:
+            np.savez(
+                f,
+                format_version=FORMAT_VERSION,
+                **{name: getattr(self, name) for name in self.__dataclass_fields__},
+            )
+
+    @classmethod
+    def load(cls, path: str) -> "CompiledTileset | None":
+        """Load a compiled tileset, None if it was written in another format."""
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["format_version"]) != FORMAT_VERSION:
+                return None
+            fields = {name: data[name] for name in cls.__dataclass_fields__}
+        fields["source_hash"] = str(fields["source_hash"])
+        return cls(**fields)
+
+    def to_patterns(self) -> List[MetaPattern]:
+        """Rebuild the patterns and their NeighborRuleSets."""
+        patterns = []
+        for i, uid in enumerate(self.uids):
+            start, end = self.image_offsets[i], self.image_offsets[i + 1]
+            patterns.append(
+                MetaPattern(
+                    uid=int(uid),
+                    name=str(self.names[i]),
+                    is_walkable=int(self.is_walkable[i]),
+                    tags={str(tag) for tag in self.tag_names[self.tags[i]]},
+                    weight=self.weights[i].item(),
+                    patterns=tuple(
+                        Pattern(
+                            image_path=str(self.image_paths[j]),
+                            weight=self.image_weights[j].item(),
+                        )
+                        for j in range(start, end)
+                    ),
+                )
+            )
+
+        for i, pattern in enumerate(patterns):
+            pattern.rules = NeighborRuleSet.from_compatibility(
+                patterns, self.compatibility, i
+            )
+        return patterns
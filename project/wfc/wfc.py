@@ -1,9 +1,11 @@
 from dataclasses import dataclass
 from enum import Enum, auto
 
-from project.wfc.grid import Grid, Point
+from project.wfc.grid import EntropyHeuristic, Grid, Point
 from project.wfc.judge import Judge
 from project.wfc.pattern import MetaPattern
+from project.wfc.profiler import Phase, Profiler
+from project.wfc.template import Template
 
 
 class Outcome(Enum):
@@ -16,6 +18,10 @@ class FailOutcome(Outcome):
     ZERO_CHOICE = auto()
     ZERO_ENTROPY = auto()
     JUDGE_ERROR = auto()
+    BACKTRACK_LIMIT = auto()
+    STEP_LIMIT = auto()
+    # the starting state, with its constraints, already has a cell without options
+    INFEASIBLE = auto()
 
 
 class SuccessOutcome(Outcome):
@@ -33,44 +39,109 @@ class StepResult:
     failed_point: Point | None = None
 
 
+@dataclass
+class GenerationResult:
+    """
+    Summary of a whole generation run. The profile is filled in by
+    generate_attempt and generate_with_backtracking when the WFC has a profiler.
+    """
+
+    success: bool = False
+    outcome: Outcome | None = None
+    steps: int = 0
+    backtracks: int = 0
+    max_depth: int = 0
+    max_rollback: int = 0
+    failed_point: Point | None = None
+    profile: dict | None = None
+
+
+@dataclass
+class Decision:
+    trail_mark: int
+    point: Point
+    pattern: MetaPattern
+
+
 class WFC:
-    def __init__(self, grid: Grid, judge: Judge) -> None:
+    def __init__(
+        self,
+        grid: Grid,
+        judge: Judge,
+        heuristic: EntropyHeuristic | None = None,
+        profiler: Profiler | None = None,
+        template: Template | None = None,
+    ) -> None:
+        """
+        The heuristic, if given, overrides the one the grid was built with.
+        With a profiler, steps are timed by phase and their outcomes counted.
+        A template, if given, constrains every generation of the grid.
+        """
         self.grid = grid
         self.judge = judge
+        if template is not None:
+            self.grid.template = template
+        self.profiler = profiler
+        if heuristic is not None:
+            self.grid.heuristic = heuristic
         self._is_initialized = False
+        self._contradiction = None
 
     def _initialize(self) -> None:
         """Initialize the grid for the WFC process."""
-        self.grid.initialize()
+        self._contradiction = self.grid.initialize()
         self._is_initialized = True
 
     def step(self, early_stopping: bool = True) -> StepResult:
-        """Perform one step in the WFC process: find, collapse, and update neighbors."""
+        """
+        Perform one step in the WFC process: find, collapse, and update neighbors.
+        Steps carry no profile, read profiler.summary() between them instead.
+        """
+        result = self._step(early_stopping)
+        if self.profiler is not None:
+            self.profiler.count(result.outcome.name if result.outcome else "SUCCESS")
+        return result
+
+    def _step(self, early_stopping: bool) -> StepResult:
         result = StepResult()
+        profiler = self.profiler
         if not self._is_initialized:
             self._initialize()
 
+        # fail if the grid cannot be completed from its initial state
+        if self._contradiction is not None and early_stopping:
+            result.outcome = FailOutcome.INFEASIBLE
+            result.failed_point = self._contradiction
+            return result
+
         # find point and fail if None
+        if profiler is not None:
+            lap = profiler.start()
         point = self.grid.find_least_entropy_cell()
+        if profiler is not None:
+            lap = profiler.lap(Phase.FIND_CELL, lap)
         result.chosen_point = point
         if point is None and early_stopping:
-            result.fail_reason = SuccessOutcome.COLLAPSED
+            result.outcome = SuccessOutcome.COLLAPSED
             return result
 
         # find possible patterns and fail if None
         possible_patterns = self.grid.get_valid_patterns(p=point)
+        if profiler is not None:
+            lap = profiler.lap(Phase.VALID_PATTERNS, lap)
         if not possible_patterns and early_stopping:
             result.outcome = FailOutcome.ZERO_CHOICE
             result.failed_point = point
             return result
 
-        state = self.grid.get_patterns_around_point(
-            p=point, view=self.judge.view, is_extended=True
-        ).copy()
-        state = self.grid.get_patterns_property(state)
+        state = self.grid.observe(p=point, view=self.judge.view)
+        if profiler is not None:
+            lap = profiler.lap(Phase.OBSERVE, lap)
 
         # get random pattern from judge and place it
         chosen_pattern = self.judge.select(objects=possible_patterns, state=state)
+        if profiler is not None:
+            lap = profiler.lap(Phase.SELECT, lap)
         if chosen_pattern is None:
             result.outcome = FailOutcome.JUDGE_ERROR
             result.failed_point = point
@@ -80,6 +151,8 @@ class WFC:
 
         # find a cell with zero entropy and fail if one such exists
         zero_entropy_cell = self.grid.update_neighbors_entropy(p=point)
+        if profiler is not None:
+            profiler.lap(Phase.PROPAGATE, lap)
         if zero_entropy_cell and early_stopping:
             result.outcome = FailOutcome.ZERO_ENTROPY
             result.failed_point = zero_entropy_cell
@@ -90,12 +163,123 @@ class WFC:
         return result
 
     def generate(self) -> bool:
-        """Run the generation process until the grid is fully collapsed or fails."""
+        """
+        Run the generation process until the grid is fully collapsed or fails.
+        Only the success is returned, read profiler.summary() for the measurements.
+        """
+        return self.generate_attempt().success
+
+    def generate_attempt(self, max_steps: int | None = None) -> GenerationResult:
+        """
+        Run the generation process once, stopping at the first failure.
+        With a profiler, the result carries a summary of its measurements so far.
+        """
+        result = GenerationResult()
+        self._initialize()
+        try:
+            while not self.is_complete():
+                if max_steps is not None and result.steps >= max_steps:
+                    result.outcome = FailOutcome.STEP_LIMIT
+                    return result
+                step_result = self.step()
+                result.steps += 1
+                if not step_result.success:
+                    result.outcome = step_result.outcome
+                    result.failed_point = step_result.failed_point
+                    return result
+        finally:
+            if self.profiler is not None:
+                result.profile = self.profiler.summary()
+        result.success = True
+        result.outcome = SuccessOutcome.COLLAPSED
+        return result
+
+    def generate_with_backtracking(
+        self,
+        max_backtracks: int | None = 1000,
+        max_rollback: int | None = None,
+        max_steps: int | None = None,
+    ) -> GenerationResult:
+        """
+        Run the generation process, undoing decisions instead of restarting on failure.
+        On a contradiction the last decision is rolled back and its pattern banned
+        at that cell; if that leaves no options, earlier decisions are rolled back too.
+        Stops after max_backtracks undone decisions in total, or when a single
+        contradiction needs more than max_rollback decisions undone, or after
+        max_steps steps.
+        With a profiler, the result carries a summary of its measurements so far.
+        """
+        result = GenerationResult()
         self._initialize()
-        while not self.is_complete():
-            if not self.step().success:
-                return False
-        return True
+        self.grid.record_trail = True
+        decisions = []
+
+        try:
+            while not self.is_complete():
+                if max_steps is not None and result.steps >= max_steps:
+                    result.outcome = FailOutcome.STEP_LIMIT
+                    return result
+                mark = self.grid.trail_mark()
+                step_result = self.step()
+                result.steps += 1
+                if step_result.success:
+                    decisions.append(
+                        Decision(
+                            trail_mark=mark,
+                            point=step_result.chosen_point,
+                            pattern=step_result.chosen_pattern,
+                        )
+                    )
+                    result.max_depth = max(result.max_depth, len(decisions))
+                    continue
+
+                result.outcome = step_result.outcome
+                result.failed_point = step_result.failed_point
+                if step_result.outcome == FailOutcome.JUDGE_ERROR:
+                    return result
+                if step_result.chosen_pattern is not None:
+                    failed = Decision(
+                        trail_mark=mark,
+                        point=step_result.chosen_point,
+                        pattern=step_result.chosen_pattern,
+                    )
+                elif decisions:
+                    failed = decisions.pop()
+                else:
+                    return result
+
+                rollback = 1
+                while True:
+                    result.backtracks += 1
+                    result.max_rollback = max(result.max_rollback, rollback)
+                    if (
+                        max_backtracks is not None
+                        and result.backtracks > max_backtracks
+                    ) or (max_rollback is not None and rollback > max_rollback):
+                        result.outcome = FailOutcome.BACKTRACK_LIMIT
+                        return result
+                    if self.profiler is not None:
+                        lap = self.profiler.start()
+                    self.grid.undo(failed.trail_mark)
+                    contradiction = self.grid.exclude_pattern(
+                        failed.point, failed.pattern
+                    )
+                    if self.profiler is not None:
+                        self.profiler.lap(Phase.UNDO, lap)
+                    if contradiction is None:
+                        break
+                    if not decisions:
+                        return result
+                    failed = decisions.pop()
+                    rollback += 1
+        finally:
+            self.grid.record_trail = False
+            if self.profiler is not None:
+                result.profile = self.profiler.summary()
+
+        result.success = True
+        result.outcome = SuccessOutcome.COLLAPSED
+        return result
 
     def is_complete(self) -> bool:
         """Check if the grid has been fully collapsed."""
@@ -0,0 +1,160 @@
+import os
+from collections import OrderedDict
+from itertools import product
+from typing import List, Tuple
+
+import numpy as np
+
+from project.utils.sampling import derive_seed
+from project.wfc.grid import Grid, Propagation, Rect
+from project.wfc.judge import Judge, RandomJudge
+from project.wfc.pattern import MetaPattern
+from project.wfc.wfc import WFC, FailOutcome
+
+
+class ChunkedWorld:
+    """
+    Unbounded world made of fixed-size chunks generated lazily on request.
+    A chunk is generated together with a margin of cells around it: margin cells
+    that overlap already generated chunks are pinned to their patterns, so chunks
+    connect seamlessly, and the free ones leave room for the chunks that come
+    later; the margin itself is thrown away. Generated chunks are kept in an
+    LRU cache; evicted chunks are spilled to spill_path if it is set, otherwise
+    they are forgotten and may be generated again differently.
+    Chunk (i, j) covers rows i * height ... and columns j * width ...
+    """
+
+    def __init__(
+        self,
+        patterns: List[MetaPattern],
+        judge: Judge | None = None,
+        chunk: Rect = Rect(width=16, height=16),
+        margin: int = 2,
+        propagation: Propagation = Propagation.FULL,
+        cache_size: int = 64,
+        spill_path: str | None = None,
+        seed: int = 0,
+        max_tries: int = 100,
+    ) -> None:
+        self.chunk = chunk
+        self.cache_size = cache_size
+        self.spill_path = spill_path
+        self.seed = seed
+        self.max_tries = max_tries
+        self.margin = margin
+        self.grid = Grid(
+            patterns=patterns,
+            rect=Rect(width=chunk.width + 2 * margin, height=chunk.height + 2 * margin),
+            propagation=propagation,
+        )
+        self.wfc = WFC(grid=self.grid, judge=judge or RandomJudge())
+        self.chunks: OrderedDict[Tuple[int, int], np.ndarray] = OrderedDict()
+        if spill_path:
+            os.makedirs(spill_path, exist_ok=True)
+
+    def _spill_file(self, i: int, j: int) -> str:
+        return os.path.join(self.spill_path, f"chunk_{i}_{j}.npy")
+
+    def _find_chunk(self, i: int, j: int) -> np.ndarray | None:
+        """Look up a generated chunk in the cache, then on disk."""
+        if (i, j) in self.chunks:
+            self.chunks.move_to_end((i, j))
+            return self.chunks[(i, j)]
+        if self.spill_path and os.path.exists(self._spill_file(i, j)):
+            indices = np.load(self._spill_file(i, j))
+            self._store(i, j, indices)
+            return indices
+        return None
+
+    def _store(self, i: int, j: int, indices: np.ndarray) -> None:
+        self.chunks[(i, j)] = indices
+        while len(self.chunks) > self.cache_size:
+            (ei, ej), evicted = self.chunks.popitem(last=False)
+            if self.spill_path:
+                np.save(self._spill_file(ei, ej), evicted)
+
+    def _margin_constraints(self, i: int, j: int) -> np.ndarray:
+        """
+        Mask of allowed patterns for chunk (i, j) extended by the margin on each side.
+        Margin cells that overlap generated chunks are pinned to their patterns.
+        """
+        rules = self.grid.rules
+        height, width, margin = self.chunk.height, self.chunk.width, self.margin
+        pinned = np.eye(len(rules), dtype=bool)
+        constraints = np.ones(
+            (height + 2 * margin, width + 2 * margin, len(rules)), dtype=bool
+        )
+        for di, dj in product((-1, 0, 1), repeat=2):
+            if (di, dj) == (0, 0):
+                continue
+            neighbor = self._find_chunk(i + di, j + dj)
+            if neighbor is None:
+                continue
+            # offset of the neighbor's first cell in the extended grid
+            ox, oy = di * height + margin, dj * width + margin
+            x0, x1 = max(0, ox), min(height + 2 * margin, ox + height)
+            y0, y1 = max(0, oy), min(width + 2 * margin, oy + width)
+            if x0 < x1 and y0 < y1:
+                cells = neighbor[x0 - ox : x1 - ox, y0 - oy : y1 - oy]
+                constraints[x0:x1, y0:y1] = pinned[cells]
+        return constraints
+
+    def _generate_chunk(self, i: int, j: int) -> np.ndarray:
+        """
+        Generate the chunk within its pinned margin, backtracking from a new
+        seed of the chunk on every try. The margin is never dropped, so a chunk
+        that cannot be fitted to its neighbors raises instead of leaving a seam.
+        """
+        self.grid.constraints = self._margin_constraints(i, j)
+        for attempt in range(self.max_tries):
+            # spawn keys must be non-negative, wrap chunk coordinates to 32 bits
+            self.wfc.judge.reseed(derive_seed(self.seed, i % 2**32, j % 2**32, attempt))
+            result = self.wfc.generate_with_backtracking()
+            if result.success:
+                return self._core()
+            # borders that contradict each other make every try fail
+            if result.outcome == FailOutcome.INFEASIBLE:
+                raise ValueError(
+                    f"Chunk ({i}, {j}) cannot fit its neighbors, margin cell "
+                    f"({result.failed_point.x}, {result.failed_point.y}) has no options."
+                )
+        raise ValueError(
+            f"Failed to generate chunk ({i}, {j}) within its neighbors "
+            f"in {self.max_tries} tries."
+        )
+
+    def _core(self) -> np.ndarray:
+        """Chunk cells of the generated grid, without the margin."""
+        margin = self.margin
+        return self.grid.get_indices()[
+            margin : margin + self.chunk.height, margin : margin + self.chunk.width
+        ]
+
+    def get_chunk(self, i: int, j: int) -> np.ndarray:
+        """Dense pattern indices of chunk (i, j), generating it if needed."""
+        indices = self._find_chunk(i, j)
+        if indices is None:
+            indices = self._generate_chunk(i, j)
+            self._store(i, j, indices)
+        return indices
+
+    def get_region(self, x: int, y: int, rect: Rect) -> np.ndarray:
+        """Dense pattern indices of a region of the world starting at (x, y)."""
+        height, width = self.chunk.height, self.chunk.width
+        region = np.empty((rect.height, rect.width), dtype=np.int16)
+        for i in range(x // height, (x + rect.height - 1) // height + 1):
+            for j in range(y // width, (y + rect.width - 1) // width + 1):
+                chunk = self.get_chunk(i, j)
+                x0, y0 = max(x, i * height), max(y, j * width)
+                x1 = min(x + rect.height, (i + 1) * height)
+                y1 = min(y + rect.width, (j + 1) * width)
+                region[x0 - x : x1 - x, y0 - y : y1 - y] = chunk[
+                    x0 - i * height : x1 - i * height, y0 - j * width : y1 - j * width
+                ]
+        return region
+
+    def get_pattern(self, x: int, y: int) -> MetaPattern:
+        """Pattern at world cell (x, y)."""
+        height, width = self.chunk.height, self.chunk.width
+        chunk = self.get_chunk(x // height, y // width)
+        return self.grid.rules.patterns[chunk[x % height, y % width]]